@@ -18,6 +18,7 @@
 #
 
 
+import os
 from export import Exporter
 try:
     from exportutils.config import Config as ExportConfig
@@ -29,6 +30,18 @@ class Mhx2Config(ExportConfig):
     def __init__(self):
         ExportConfig.__init__(self)
         self.useBinary     = False
+        self.useContainer  = False
+        self.compressLevel = 9
+        self.workers       = 1
+        self.quantizeBits  = 0
+        self.weightBits    = 16
+        self.useBaseMeshRef = False
+        self.useMorphDeltas = False
+        self.useSharedArrays = False
+        self.useCompactMasks = False
+        self.usePatch      = False
+        self.useTextureLinks = False
+        self.useSubdivCage = False
 
 
 class ExporterMhx2(Exporter):
@@ -39,11 +52,22 @@ class ExporterMhx2(Exporter):
         self.fileExtension = "mhx2"
         self.orderPriority = 80.0
         self.useBinary = False
+        self.useContainer = False
 
     def build(self, options, taskview):
         import gui
         Exporter.build(self, options, taskview)
         self.useBinary   = options.addWidget(gui.CheckBox("Binary file", False))
+        self.useContainer   = options.addWidget(gui.CheckBox("Binary container", False))
+        self.useParallel   = options.addWidget(gui.CheckBox("Parallel encoding", False))
+        self.useQuantize   = options.addWidget(gui.CheckBox("Quantize positions and weights", False))
+        self.useBaseMeshRef   = options.addWidget(gui.CheckBox("Reference base mesh", False))
+        self.useMorphDeltas   = options.addWidget(gui.CheckBox("Morph deltas", False))
+        self.useSharedArrays  = options.addWidget(gui.CheckBox("Share identical arrays", False))
+        self.useCompactMasks  = options.addWidget(gui.CheckBox("Compact delete masks", False))
+        self.usePatch         = options.addWidget(gui.CheckBox("Patch existing file", False))
+        self.useTextureLinks  = options.addWidget(gui.CheckBox("Hard-link textures", False))
+        self.useSubdivCage    = options.addWidget(gui.CheckBox("Subdivision as modifier", False))
         self.useExpressions   = options.addWidget(gui.CheckBox("Expressions", False))
         self.usePoses   = options.addWidget(gui.CheckBox("Poses", False))
         #self.feetOnGround   = options.addWidget(gui.CheckBox("Feet on ground", True))
@@ -60,6 +84,18 @@ class ExporterMhx2(Exporter):
         cfg = Mhx2Config()
         cfg.useTPose          = False
         cfg.useBinary         = self.useBinary.selected
+        cfg.useContainer      = self.useContainer.selected
+        if self.useParallel.selected:
+            cfg.workers       = os.cpu_count() or 1
+        if self.useQuantize.selected:
+            cfg.quantizeBits  = 16
+        cfg.useBaseMeshRef    = self.useBaseMeshRef.selected
+        cfg.useMorphDeltas    = self.useMorphDeltas.selected
+        cfg.useSharedArrays   = self.useSharedArrays.selected
+        cfg.useCompactMasks   = self.useCompactMasks.selected
+        cfg.usePatch          = self.usePatch.selected
+        cfg.useTextureLinks   = self.useTextureLinks.selected
+        cfg.useSubdivCage     = self.useSubdivCage.selected
         cfg.useExpressions    = self.useExpressions.selected
         cfg.usePoses          = self.usePoses.selected
         cfg.feetOnGround      = self.feetOnGround.selected
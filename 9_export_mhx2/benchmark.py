@@ -0,0 +1,215 @@
+#
+#    MakeHuman .mhx2 exporter
+#    Copyright (C) Thomas Larsson 2014 - 2020
+#    Copyright (C) MakeHuman Community 2020
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Abstract
+Benchmarks for the exporter. Run them from the Shell tab in MakeHuman:
+
+    import importlib
+    bench = importlib.import_module("plugins.9_export_mhx2.benchmark")
+    bench.benchEncoder()
+
+Without arguments the benchmarks use a synthetic struct with the array
+sizes of a default hm8 human, with helpers, and a full set of proxies.
+"""
+
+import time
+from collections import OrderedDict
+import numpy as np
+import log
+
+from .hm8 import NTotalVerts, NBodyVerts
+
+#-----------------------------------------------------------------------
+#   Synthetic human
+#-----------------------------------------------------------------------
+
+NBones = 163
+NWeightsPerBone = 320
+
+ProxySizes = [
+    ("Proxy", "Proxymeshes", 13380, True),
+    ("Eyes", "Eyes", 284, False),
+    ("Eyebrows", "Eyebrows", 272, False),
+    ("Eyelashes", "Eyelashes", 1000, False),
+    ("Teeth", "Teeth", 1800, False),
+    ("Tongue", "Tongue", 584, False),
+    ("Hair", "Hair", 7500, False),
+    ("Shirt", "Clothes", 9800, False),
+    ("Pants", "Clothes", 8700, False),
+    ("Shoes", "Clothes", 4200, False),
+]
+
+
+def makeHumanStruct(seed=0):
+    rng = np.random.default_rng(seed)
+    mhFile = OrderedDict()
+    mhFile["mhx2_version"] = "0.31"
+    mhGeos = mhFile["geometries"] = []
+
+    mhGeo = OrderedDict()
+    mhGeo["name"] = "Bench:Body"
+    mhGeo["human"] = True
+    mhGeo["mesh"] = makeMesh(rng, NBodyVerts)
+    mhGeo["seed_mesh"] = makeMesh(rng, NTotalVerts)
+    mhGeos.append(mhGeo)
+
+    for pname,ptype,nverts,human in ProxySizes:
+        mhGeo = OrderedDict()
+        mhGeo["name"] = "Bench:%s" % pname
+        mhGeo["human"] = human
+        mhGeo["mesh"] = makeMesh(rng, nverts)
+        mhGeo["seed_mesh"] = makeMesh(rng, nverts)
+        if human:
+            mhGeo["proxy_seed_mesh"] = makeMesh(rng, nverts)
+        mhProxy = mhGeo["proxy"] = OrderedDict()
+        mhProxy["name"] = pname
+        mhProxy["type"] = ptype
+        vnums = rng.integers(0, NTotalVerts, size=(nverts,3)).astype(float)
+        weights = rng.random((nverts,3))
+        offsets = rng.normal(scale=0.01, size=(nverts,3))
+        mhProxy["fitting"] = np.stack([vnums, weights, offsets], axis=1)
+        mhProxy["delete_verts"] = (rng.random(NTotalVerts) < 0.1).tolist()
+        mhGeos.append(mhGeo)
+    return mhFile
+
+
+def makeMesh(rng, nverts):
+    nfaces = nverts
+    mhMesh = OrderedDict()
+    mhMesh["vertices"] = rng.normal(size=(nverts,3)).astype(np.float32)
+    mhMesh["uv_coordinates"] = rng.random((nverts + nverts//10, 2))
+    mhMesh["faces"] = rng.integers(0, nverts, size=(nfaces,4))
+    mhMesh["uv_faces"] = rng.integers(0, nverts, size=(nfaces,4))
+    mhWeights = mhMesh["weights"] = OrderedDict()
+    for bn in range(min(NBones, nverts//10 + 1)):
+        nweights = min(NWeightsPerBone, nverts)
+        vnums = np.sort(rng.choice(nverts, nweights, replace=False))
+        mhWeights["bone%03d" % bn] = np.array(list(zip(vnums, rng.random(nweights))))
+    return mhMesh
+
+#-----------------------------------------------------------------------
+#   Json encoder
+#-----------------------------------------------------------------------
+
+def benchEncoder(struct=None, repeat=3):
+    from . import save_json
+
+    if struct is None:
+        struct = makeHumanStruct()
+    useArrayEncoder = save_json.UseArrayEncoder
+    try:
+        save_json.UseArrayEncoder = False
+        slow,string1 = timeIt(save_json.encodeJsonData3, struct, repeat)
+        save_json.UseArrayEncoder = True
+        fast,string2 = timeIt(save_json.encodeJsonData3, struct, repeat)
+    finally:
+        save_json.UseArrayEncoder = useArrayEncoder
+
+    if string1 != string2:
+        log.error("Array encoder output differs from recursive encoder")
+    log.message("Json encoder on %.1f MB: recursive %.2f s, arrays %.2f s, speedup %.1fx" %
+        (len(string1)/2**20, slow, fast, slow/max(fast, 1e-6)))
+    return slow,fast
+
+
+def timeIt(func, arg, repeat):
+    best = None
+    for _ in range(repeat):
+        t1 = time.perf_counter()
+        result = func(arg)
+        secs = time.perf_counter() - t1
+        if best is None or secs < best:
+            best = secs
+    return best,result
+
+#-----------------------------------------------------------------------
+#   Bvh loader
+#-----------------------------------------------------------------------
+
+def benchBvh(filepath=None, nframes=20000, njoints=NBones, repeat=3):
+    from . import quick_bvh
+
+    if filepath is None:
+        import tempfile
+        import os
+        fd,filepath = tempfile.mkstemp(suffix=".bvh")
+        os.close(fd)
+        try:
+            makeBvhFile(filepath, nframes, njoints)
+            return benchBvh(filepath, repeat=repeat)
+        finally:
+            os.remove(filepath)
+
+    import os
+    secs,result = timeIt(quick_bvh.loadBvh, filepath, repeat)
+    joints,channels,frames,locations = result
+    size = os.path.getsize(filepath)/2**20
+    log.message("Bvh loader on %.1f MB, %d frames, %d joints: %.2f s, %.1f MB/s, %d frames/s" %
+        (size, len(frames), len(joints), secs, size/max(secs, 1e-6), len(frames)/max(secs, 1e-6)))
+    return secs
+
+
+def makeBvhFile(filepath, nframes, njoints, seed=0):
+    rng = np.random.default_rng(seed)
+    with open(filepath, "w", encoding="utf-8") as fp:
+        fp.write("HIERARCHY\n")
+        fp.write("ROOT joint000\n{\n  OFFSET 0 0 0\n")
+        fp.write("  CHANNELS 6 Xposition Yposition Zposition Zrotation Xrotation Yrotation\n")
+        for jn in range(1, njoints):
+            fp.write("  JOINT joint%03d\n  {\n    OFFSET 0 1 0\n" % jn)
+            fp.write("    CHANNELS 3 Zrotation Xrotation Yrotation\n  }\n")
+        fp.write("}\nMOTION\nFrames: %d\nFrame Time: 0.033333\n" % nframes)
+        ncols = 3*njoints + 3
+        for _ in range(0, nframes, 1000):
+            data = rng.normal(scale=30, size=(min(1000, nframes), ncols))
+            data[np.abs(data) < 0.1] = 0
+            np.savetxt(fp, data, fmt="%.6f")
+
+#-----------------------------------------------------------------------
+#   Weights
+#-----------------------------------------------------------------------
+
+NWeightsPerVert = 4
+
+def benchWeights(repeat=3, seed=0):
+    from types import SimpleNamespace
+    from . import mh2mhx2
+
+    rng = np.random.default_rng(seed)
+    bones = [SimpleNamespace(name="bone%03d" % bn) for bn in range(NBones)]
+    skel = SimpleNamespace(getBones=lambda: bones)
+    meshWeights = []
+    for nverts in [NTotalVerts, NBodyVerts] + [size[2] for size in ProxySizes]:
+        vertexWeights = {}
+        nweights = max(1, nverts*NWeightsPerVert//NBones)
+        for bone in bones:
+            vnums = rng.integers(0, nverts, size=nweights).astype(np.int32)
+            vertexWeights[bone.name] = (vnums, rng.random(nweights).astype(np.float32))
+        meshWeights.append(vertexWeights)
+
+    def addAllWeights(meshWeights):
+        for vertexWeights in meshWeights:
+            mh2mhx2.addWeights(OrderedDict(), skel, vertexWeights)
+
+    secs,_ = timeIt(addAllWeights, meshWeights, repeat)
+    nweights = sum([len(vnums) for vertexWeights in meshWeights for vnums,_ in vertexWeights.values()])
+    log.message("Weights of %d meshes, %d bones, %d weights: %.3f s" %
+        (len(meshWeights), NBones, nweights, secs))
+    return secs
@@ -35,8 +35,9 @@ from core import G
 import log
 
 import skeleton
-from .save_json import saveJson
-from .hm8 import getBaseMesh
+from .save_json import saveJson, savePatch, quantizeGeometries, shareArrays, encodeNumericArray, encodeMask
+from .save_json import CachedDict
+from .hm8 import getBaseMesh, NTotalVerts
 from material import getSkinBlender
 from uuid import uuid4
 
@@ -52,11 +53,11 @@ def exportMhx2(filepath, cfg):
 
     filename = os.path.basename(filepath)
     name = cfg.goodName(os.path.splitext(filename)[0])
-    texhandler = TextureHandler(filepath)
+    texhandler = TextureHandler(filepath, cfg.useTextureLinks)
 
-    # Collect objects, scale meshes and filter out hidden faces/verts, scale rig
+    # Collect objects, scale meshes and filter out hidden faces/verts, scale rig.
+    # Objects that did not change since the last export are taken from the cache.
     objects = human.getObjects(excludeZeroFaceObjs=True)
-    meshes = [obj.mesh.clone(cfg.scale, True) for obj in objects]
     #human.changeVertexMask(None)
     skel = human.getSkeleton()
     if skel:
@@ -64,6 +65,13 @@ def exportMhx2(filepath, cfg):
         if False and not skel.isInRestPose():
             skel = skel.createFromPose()
             print("REST", skel)
+    weightsKey = getWeightsKey(skel)
+    changeKeys = [getChangeKey(obj, skel, weightsKey, name, cfg) for obj in objects]
+    cached = [getCachedGeometry(obj, key) for obj,key in zip(objects, changeKeys)]
+    meshes = [getExportMesh(obj, cfg) for obj in objects]
+    meshes = [(mesh if mhGeo is not None else mesh.clone(cfg.scale, True))
+              for mesh,mhGeo in zip(meshes, cached)]
+    if skel and None in cached:
         try:
             rawWeights = human.getVertexWeights(skel)
         except TypeError:
@@ -74,22 +82,21 @@ def exportMhx2(filepath, cfg):
     mhFile = OrderedDict()
     mhFile["mhx2_version"] = Mhx2Version
     log.message(mhFile)
-    #mhFile["basemesh"] = getBaseMesh()
+    if cfg.useBaseMeshRef:
+        mhFile["basemesh"] = getBaseMesh()
 
     if skel:
         mhSkel = mhFile["skeleton"] = OrderedDict()
         addSkeleton(mhSkel, skel, name, cfg)
 
         if cfg.useExpressions:
-            mhExpr = mhSkel["expressions"] = OrderedDict()
-            path = os.path.join("data", "poseunits")
-            addAnims(path, mhExpr)
-            path = os.path.join("data", "expressions")
-            addJsons(path, ".mhpose", mhExpr)
+            mhSkel["expressions"] = getStaticBlock("expressions",
+                [os.path.join("data", "poseunits"), os.path.join("data", "expressions")],
+                addExpressions)
         if cfg.usePoses:
-            mhAnim = mhSkel["animation"] = OrderedDict()
-            path = os.path.join("data", "poses")
-            addAnims(path, mhAnim)
+            mhSkel["animation"] = getStaticBlock("animation",
+                [os.path.join("data", "poses")],
+                addPoses)
 
     mhMaterials = mhFile["materials"] = []
     mats = {}
@@ -101,12 +108,40 @@ def exportMhx2(filepath, cfg):
         addMaterial(mhMaterials, mesh.material, mname, texhandler)
 
     mhGeos = mhFile["geometries"] = []
-    for mesh in meshes:
-        mname = getGeoName(name, mesh.name)
-        addGeometry(mhGeos, mesh, skel, rawWeights, mats, mname, cfg)
+    for mesh,mhGeo in zip(meshes, cached):
+        if mhGeo is None:
+            mname = getGeoName(name, mesh.name)
+            addGeometry(mhGeos, mesh, skel, rawWeights, mats, mname, cfg)
+        else:
+            mhGeo["uuid"] = str(uuid4())
+            mhGeos.append(mhGeo)
+    updateExportCache(objects, changeKeys, mhGeos)
+    log.message("Reused %d of %d geometries from the export cache" %
+        (len(cached) - cached.count(None), len(cached)))
+
+    texhandler.finish()
+    saveBaseMeshReferences(human, mhGeos, filepath)
+
+    if cfg.quantizeBits:
+        mhFile = quantizeGeometries(mhFile, cfg.quantizeBits, cfg.weightBits)
+    usePatch = (cfg.usePatch and not cfg.useContainer and os.path.exists(filepath))
+    if cfg.useSharedArrays and not cfg.useContainer and not usePatch:
+        mhFile = shareArrays(mhFile)
+
+    if usePatch:
+        # Shared array references are only valid within one file
+        patchpath = os.path.splitext(filepath)[0] + ".mhx2patch"
+        G.app.progress(0.2, text="Writing patch file %s" % patchpath)
+        if savePatch(mhFile, patchpath, filepath, cfg.useBinary, cfg.compressLevel, cfg.workers):
+            G.app.progress(1)
+            log.message("%s written" % patchpath)
+            return
+        log.message("%s has no section index. Writing full file" % filepath)
 
     G.app.progress(0.2, text="Writing Json file %s" % filepath)
-    saveJson(mhFile, filepath, cfg.useBinary)
+    def progress(fraction, text):
+        G.app.progress(0.2 + 0.8*fraction, text=text)
+    saveJson(mhFile, filepath, cfg.useBinary, cfg.useContainer, cfg.compressLevel, progress, cfg.workers)
     G.app.progress(1)
     log.message("%s written" % filepath)
 
@@ -139,6 +174,55 @@ def addJson(folder, file):
         return None
 
 
+#-----------------------------------------------------------------------
+#   Expressions and poses are read from the static data folders. The
+#   blocks are kept with their json text until a file in the folders
+#   changes, and parsed bvh files are kept until the file changes.
+#-----------------------------------------------------------------------
+
+theStaticBlocks = {}
+theBvhCache = {}
+
+def getStaticBlock(key, folders, build):
+    stamp = [getFolderStamp(folder) for folder in folders]
+    entry = theStaticBlocks.get(key)
+    if entry and entry[0] == stamp:
+        return entry[1]
+    block = CachedDict()
+    build(block)
+    theStaticBlocks[key] = (stamp, block)
+    return block
+
+
+def getFolderStamp(folder):
+    if not os.path.exists(folder):
+        return None
+    stamp = []
+    for file in sorted(os.listdir(folder)):
+        stat = os.stat(os.path.join(folder, file))
+        stamp.append((file, stat.st_mtime, stat.st_size))
+    return stamp
+
+
+def addExpressions(mhExpr):
+    addAnims(os.path.join("data", "poseunits"), mhExpr)
+    addJsons(os.path.join("data", "expressions"), ".mhpose", mhExpr)
+
+
+def addPoses(mhAnim):
+    addAnims(os.path.join("data", "poses"), mhAnim)
+
+
+def loadBvhCached(path):
+    from . import quick_bvh
+    stat = os.stat(path)
+    stamp = (stat.st_mtime, stat.st_size)
+    entry = theBvhCache.get(path)
+    if entry is None or entry[0] != stamp:
+        entry = theBvhCache[path] = (stamp, quick_bvh.loadBvh(path))
+    return entry[1]
+
+
 def addAnims(folder, mhAnim):
     if not os.path.exists(folder):
         return
@@ -147,8 +231,6 @@ def addAnims(folder, mhAnim):
 
 
 def addAnim(folder, file, mhAnim):
-    from . import quick_bvh
-
     path = os.path.join(folder, file)
     fname,ext = os.path.splitext(file)
     if ext == ".bvh":
@@ -157,7 +239,7 @@ def addAnim(folder, file, mhAnim):
         if jstruct:
             mhComp["json"] = jstruct
         mhBvh = mhComp["bvh"] = OrderedDict()
-        joints, channels, frames, locations = quick_bvh.loadBvh(path)
+        joints, channels, frames, locations = loadBvhCached(path)
         mhBvh["joints"] = joints
         #mhBvh["channels"] = channels
         mhBvh["frames"] = frames
@@ -210,12 +292,36 @@ def addMaterial(mhMaterials, mat, mname, texhandler):
         mhMat["viewPortAlpha"] = mat.viewPortAlpha
 
 
+#-----------------------------------------------------------------------
+#   Textures.
+#   Textures are copied by a thread pool while the geometries are made.
+#   A texture is not copied again if the destination has the same size
+#   and content, and sources with the same content are copied once.
+#   Content hashes are kept with the size and mtime of the file, so
+#   unchanged files are only read the first time. On the same file
+#   system, textures are cloned with a reflink where supported, or
+#   hard-linked if the user asks for it.
+#-----------------------------------------------------------------------
+
+TextureCopyWorkers = 4
+FICLONE = 0x40049409
+
+theFileHashes = {}
+
 class TextureHandler:
 
-    def __init__(self, filepath):
+    def __init__(self, filepath, useLinks=False):
         self.outFolder = os.path.realpath(os.path.dirname(filepath))
         self.texFolder = self.getSubFolder(self.outFolder, "textures")
+        self.useLinks = useLinks
         self._copiedFiles = {}
+        self._contents = {}
+        self._targets = set()
+        self._jobs = []
+        self._pool = None
+        if sys.version_info[0] >= 3:
+            from concurrent.futures import ThreadPoolExecutor
+            self._pool = ThreadPoolExecutor(max_workers=TextureCopyWorkers)
 
 
     def getSubFolder(self, path, name):
@@ -231,24 +337,76 @@ class TextureHandler:
 
 
     def copyTextureToNewLocation(self, filepath):
-        srcDir = os.path.abspath(os.path.expanduser(os.path.dirname(filepath)))
-        filename = os.path.basename(filepath)
+        srcpath = os.path.realpath(os.path.expanduser(filepath))
+        if srcpath in self._copiedFiles.keys():
+            return self._copiedFiles[srcpath]
+
+        newpath = self.getSameContent(srcpath)
+        if newpath:
+            self._jobs.append((filepath, newpath, None))
+        else:
+            newpath = self.getNewPath(srcpath)
+            self.addContent(srcpath, newpath)
+            if self._pool:
+                job = self._pool.submit(copyTexture, srcpath, newpath, self.useLinks)
+            else:
+                job = copyTexture(srcpath, newpath, self.useLinks)
+            self._jobs.append((filepath, newpath, job))
+
+        relpath = os.path.relpath(newpath, self.outFolder)
+        relpath = self._copiedFiles[srcpath] = str(os.path.normpath(relpath))
+        return relpath
+
 
+    def getNewPath(self, srcpath):
+        """
+        Path in the texture folder. Different textures with the same file
+        name get a numbered name, so they are not written to the same file.
+        """
+        filename = os.path.basename(srcpath)
         newpath = os.path.abspath( os.path.join(self.texFolder, filename) )
+        fname,ext = os.path.splitext(filename)
+        n = 1
+        while newpath in self._targets:
+            newpath = os.path.abspath( os.path.join(self.texFolder, "%s_%d%s" % (fname, n, ext)) )
+            n += 1
+        self._targets.add(newpath)
+        return newpath
+
+
+    def getSameContent(self, srcpath):
+        """
+        Destination of an earlier texture with the same content. Files are
+        only hashed if they have the same size as another texture.
+        """
         try:
-            self._copiedFiles[filepath]
-            done = True
-        except:
-            done = False
-        if not done:
-            try:
-                shutil.copyfile(filepath, newpath)
-            except:
-                log.message("Unable to copy \"%s\" -> \"%s\"" % (filepath, newpath))
-            self._copiedFiles[filepath] = True
+            size = os.path.getsize(srcpath)
+        except OSError:
+            return None
+        if size not in self._contents.keys():
+            return None
+        digest = getFileHash(srcpath)
+        if digest is None:
+            return None
+        entries = self._contents[size]
+        for n,entry in enumerate(entries):
+            path,newpath,digest1 = entry
+            if digest1 is None:
+                digest1 = getFileHash(path)
+                entries[n] = (path, newpath, digest1)
+            if digest1 == digest:
+                return newpath
+        return None
 
-        relpath = os.path.relpath(newpath, self.outFolder)
-        return str(os.path.normpath(relpath))
+
+    def addContent(self, srcpath, newpath):
+        try:
+            size = os.path.getsize(srcpath)
+        except OSError:
+            return
+        if size not in self._contents.keys():
+            self._contents[size] = []
+        self._contents[size].append((srcpath, newpath, None))
 
 
     def addTexture(self, mhMat, key, filepath):
@@ -258,10 +416,116 @@ class TextureHandler:
         mhMat[key] = newpath.replace("\\","/")
 
 
+    def finish(self):
+        """
+        Wait for the copies to finish, and report what was done.
+        """
+        counts = {}
+        for filepath,newpath,job in self._jobs:
+            if job is None:
+                result = "duplicate"
+            elif self._pool:
+                result = job.result()
+            else:
+                result = job
+            if result is None:
+                log.message("Unable to copy \"%s\" -> \"%s\"" % (filepath, newpath))
+                result = "failed"
+            counts[result] = counts.get(result, 0) + 1
+        if self._pool:
+            self._pool.shutdown()
+            self._pool = None
+        self._jobs = []
+        if counts:
+            log.message("Textures: %s" %
+                ", ".join(["%d %s" % (counts[key], key) for key in sorted(counts.keys())]))
+        return counts
+
+
     def goodName(self, name):
         string = name.replace(" ", "_").replace("-","_").lower()
         return string
 
+
+def copyTexture(srcpath, newpath, useLinks=False):
+    """
+    Copy a texture unless the destination already has the same content.
+    Returns how the texture was copied, or None on failure.
+    """
+    try:
+        if os.path.exists(newpath):
+            if os.path.samefile(srcpath, newpath):
+                # A link left by an export with hard-linked textures is
+                # replaced by a copy, but the source itself is kept
+                if useLinks or not isLinkToSource(srcpath, newpath):
+                    return "unchanged"
+            elif (os.path.getsize(srcpath) == os.path.getsize(newpath) and
+                  getFileHash(srcpath) == getFileHash(newpath)):
+                return "unchanged"
+            # Never write through a link to another file
+            os.remove(newpath)
+        if os.stat(srcpath).st_dev == os.stat(os.path.dirname(newpath)).st_dev:
+            if useLinks:
+                try:
+                    os.link(srcpath, newpath)
+                    return "linked"
+                except OSError:
+                    pass
+            if cloneFile(srcpath, newpath):
+                return "cloned"
+        shutil.copyfile(srcpath, newpath)
+        return "copied"
+    except (OSError, IOError):
+        return None
+
+
+def isLinkToSource(srcpath, newpath):
+    """
+    Whether newpath is a hard or symbolic link to srcpath, rather than
+    srcpath itself reached through another folder path.
+    """
+    srcfolder = os.path.realpath(os.path.dirname(srcpath))
+    newfolder = os.path.realpath(os.path.dirname(newpath))
+    if (srcfolder == newfolder and
+        os.path.basename(srcpath) == os.path.basename(newpath)):
+        return False
+    return (os.path.islink(newpath) or os.stat(newpath).st_nlink > 1)
+
+
+def cloneFile(srcpath, newpath):
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+    try:
+        with open(srcpath, "rb") as src, open(newpath, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except (OSError, IOError):
+        return False
+
+
+def getFileHash(filepath):
+    """
+    Sha1 of the file content, kept with the size and mtime of the file.
+    """
+    import hashlib
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    key = (os.path.realpath(filepath), stat.st_size, stat.st_mtime)
+    if key in theFileHashes.keys():
+        return theFileHashes[key]
+    sha = hashlib.sha1()
+    try:
+        with open(filepath, "rb") as fp:
+            for chunk in iter(lambda: fp.read(2**20), b""):
+                sha.update(chunk)
+    except (OSError, IOError):
+        return None
+    digest = theFileHashes[key] = sha.hexdigest()
+    return digest
+
 #-----------------------------------------------------------------------
 #   Skeletons
 #-----------------------------------------------------------------------
@@ -311,9 +575,23 @@ def getRoll(rmat):
 #   Meshes
 #-----------------------------------------------------------------------
 
+def getExportMesh(obj, cfg):
+    """
+    The mesh shown in MakeHuman, or the unsubdivided cage of a subdivided
+    object, which the importer subdivides with a Subsurf modifier.
+    """
+    if cfg.useSubdivCage and obj.isSubdivided():
+        if obj.proxy:
+            return obj.getProxyMesh()
+        else:
+            return obj.getSeedMesh()
+    else:
+        return obj.mesh
+
+
 def addGeometry(mhGeos, mesh, skel, rawWeights, mats, mname, cfg):
 
-    mhGeo = OrderedDict()
+    mhGeo = CachedDict()
     mhGeos.append(mhGeo)
 
     obj = mesh.object
@@ -331,6 +609,8 @@ def addGeometry(mhGeos, mesh, skel, rawWeights, mats, mname, cfg):
     mhGeo["offset"] = cfg.offset
     mhGeo["scale"] = cfg.scale
     mhGeo["issubdivided"] = obj.isSubdivided()
+    if obj.isSubdivided() and cfg.useSubdivCage:
+        mhGeo["subdivision_levels"] = 1
     try:
         mhGeo["material"] = mats[mesh.name]
     except KeyError:
@@ -344,6 +624,11 @@ def addGeometry(mhGeos, mesh, skel, rawWeights, mats, mname, cfg):
     mhSeed = mhGeo["seed_mesh"] = OrderedDict()
     obj = mesh.object
     addMesh(mhSeed, obj.getSeedMesh())
+    if cfg.useBaseMeshRef and (pxy is None or pxy.type == 'Proxymeshes'):
+        refBaseMesh(mhSeed)
+    if cfg.useMorphDeltas and (pxy is None or pxy.type == 'Proxymeshes'):
+        refBaseShape(mhMesh, cfg.scale)
+        refBaseShape(mhSeed, 1.0)
 
     if pxy:
         if pxy.type == 'Proxymeshes':
@@ -382,7 +667,10 @@ def addGeometry(mhGeos, mesh, skel, rawWeights, mats, mname, cfg):
                 for n,vnums in enumerate(pxy.ref_vIdxs)]
             )
         #mhProxy["ref_wvIdxs"] = pxy.ref_wvIdxs
-        mhProxy["delete_verts"] = pxy.deleteVerts
+        if cfg.useCompactMasks:
+            mhProxy["delete_verts"] = encodeMask(pxy.deleteVerts)
+        else:
+            mhProxy["delete_verts"] = pxy.deleteVerts
         if hasattr(pxy, "vertexBoneWeights") and pxy.vertexBoneWeights:
             mhProxy["vertex_bone_weights"] = pxy.vertexBoneWeights.data
         else:
@@ -398,22 +686,116 @@ def addGeometry(mhGeos, mesh, skel, rawWeights, mats, mname, cfg):
             addWeights(mhMesh, skel, weights)
 
 
+#-----------------------------------------------------------------------
+#   Export cache.
+#   The geometries of the last export are kept with a key that hashes
+#   everything they are made from: the unscaled mesh, its uvs and face
+#   mask, the proxy with its delete mask and own bone weights, the
+#   skeleton and its vertex weights, the names and the export options
+#   that change geometries. An unchanged object is not
+#   cloned, its weights are not recomputed, and its json text is reused.
+#-----------------------------------------------------------------------
+
+theExportCache = {}
+
+def getObjectKey(obj):
+    if obj.proxy:
+        return obj.proxy.uuid
+    else:
+        return obj.name
+
+
+def getChangeKey(obj, skel, weightsKey, name, cfg):
+    import hashlib
+    sha = hashlib.sha1()
+    mesh = obj.mesh
+    sha.update(np.ascontiguousarray(mesh.coord, dtype=np.float32).tobytes())
+    sha.update(np.ascontiguousarray(mesh.texco, dtype=np.float32).tobytes())
+    sha.update(np.ascontiguousarray(mesh.fuvs, dtype=np.int32).tobytes())
+    if hasattr(mesh, "getFaceMask"):
+        sha.update(np.ascontiguousarray(mesh.getFaceMask(), dtype=bool).tobytes())
+    pxy = obj.proxy
+    if pxy:
+        sha.update(("%s:%s:%s" % (pxy.uuid, pxy.type, pxy.name)).encode("utf-8"))
+        sha.update(np.ascontiguousarray(pxy.deleteVerts, dtype=bool).tobytes())
+        if hasattr(pxy, "vertexBoneWeights") and pxy.vertexBoneWeights:
+            updateWeightsHash(sha, pxy.vertexBoneWeights)
+    if skel:
+        sha.update(("%s:%s" % (skel.name, getattr(skel, "file", ""))).encode("utf-8"))
+        sha.update(":".join([bone.name for bone in skel.getBones()]).encode("utf-8"))
+        sha.update(weightsKey.encode("utf-8"))
+    settings = (name, mesh.name, mesh.material.name, obj.isSubdivided(),
+        cfg.scale, list(cfg.offset), cfg.useBaseMeshRef, cfg.useMorphDeltas,
+        cfg.useCompactMasks, cfg.useSubdivCage)
+    sha.update(repr(settings).encode("utf-8"))
+    return sha.hexdigest()
+
+
+def getWeightsKey(skel):
+    """
+    Hash of the vertex weights of the skeleton, which the weights of all
+    meshes and proxies are made from. Computed once per export.
+    """
+    import hashlib
+    sha = hashlib.sha1()
+    if skel and getattr(skel, "vertexWeights", None):
+        updateWeightsHash(sha, skel.vertexWeights)
+    return sha.hexdigest()
+
+
+def updateWeightsHash(sha, vertexWeights):
+    if hasattr(vertexWeights, "data"):
+        vertexWeights = vertexWeights.data
+    for bname in sorted(vertexWeights.keys()):
+        idxs,weights = vertexWeights[bname]
+        sha.update(bname.encode("utf-8"))
+        sha.update(np.ascontiguousarray(idxs, dtype=np.int32).tobytes())
+        sha.update(np.ascontiguousarray(weights, dtype=np.float32).tobytes())
+
+
+def getCachedGeometry(obj, key):
+    entry = theExportCache.get(getObjectKey(obj))
+    if entry and entry[0] == key:
+        return entry[1]
+    return None
+
+
+def updateExportCache(objects, keys, mhGeos):
+    theExportCache.clear()
+    for obj,key,mhGeo in zip(objects, keys, mhGeos):
+        theExportCache[getObjectKey(obj)] = (key, mhGeo)
+
+
+def clearExportCache():
+    theExportCache.clear()
+
+
 def addWeights(mhMesh, skel, vertexWeights):
+    if hasattr(vertexWeights, "data"):
+        vertexWeights = vertexWeights.data
     mhWeights = mhMesh["weights"] = OrderedDict()
     for bone in skel.getBones():
         try:
-            if hasattr(vertexWeights, "data"):
-                idxs,weights = vertexWeights.data[bone.name]
-            else:
-                idxs,weights = vertexWeights[bone.name]
+            idxs,weights = vertexWeights[bone.name]
         except KeyError:
             continue
-        assoc = [(vn,weights[n]) for n,vn in enumerate(idxs)]
-        assoc.sort()
-        while assoc[0][0] < 0:
-            assoc = assoc[1:]
+        assoc = getSortedWeights(idxs, weights)
         if len(assoc) > 0:
-            mhWeights[bone.name] = np.array(assoc)
+            mhWeights[bone.name] = assoc
+
+
+def getSortedWeights(idxs, weights):
+    """
+    (vn, weight) pairs sorted by vertex number and weight, without
+    negative vertex numbers, as one float array.
+    """
+    idxs = np.asarray(idxs)
+    weights = np.asarray(weights)
+    order = np.lexsort((weights, idxs))
+    assoc = np.empty((len(order), 2))
+    assoc[:,0] = idxs[order]
+    assoc[:,1] = weights[order]
+    return assoc[np.searchsorted(assoc[:,0], 0):]
 
 
 def addMesh(mhGeo, mesh):
@@ -427,19 +809,153 @@ def addMesh(mhGeo, mesh):
     # so we have to work with an additional list for export
     #
     if mesh.vertsPerFaceForExport != 4:
-        temp_faces = []
-        for fn, fv in enumerate(mesh.fvert):
-           temp_faces.append([fv[0], fv[1], fv[2]])
-        mhGeo["faces"] = temp_faces
-
-        utemp_faces = []
-        for fn, fv in enumerate(mesh.fuvs):
-           utemp_faces.append([fv[0], fv[1], fv[2]])
-        mhGeo["uv_faces"] = utemp_faces
+        mhGeo["faces"] = np.ascontiguousarray(np.asarray(mesh.fvert)[:,:3])
+        mhGeo["uv_faces"] = np.ascontiguousarray(np.asarray(mesh.fuvs)[:,:3])
     else:
         mhGeo["faces"] = mesh.fvert
         mhGeo["uv_faces"] = mesh.fuvs
 
+#-----------------------------------------------------------------------
+#   Shared base mesh topology.
+#   The faces, uv faces and uv coordinates of the human seed mesh are
+#   the same for every hm8 human. They can be replaced by a reference
+#   with a content hash. The topology is written once as
+#   hm8_topology_<hash>.mxa next to the mhx2 file, where the importer
+#   finds and caches it. The hash must agree with getTopologyHash in
+#   the importer.
+#-----------------------------------------------------------------------
+
+def refBaseMesh(mhMesh):
+    if len(mhMesh["vertices"]) != NTotalVerts:
+        return
+    mhRef = OrderedDict()
+    mhRef["basemesh"] = "hm8"
+    mhRef["hash"] = getTopologyHash(mhMesh)
+    for key in ["faces", "uv_faces", "uv_coordinates"]:
+        del mhMesh[key]
+    mhMesh["topology"] = mhRef
+
+
+def getTopologyHash(mhMesh):
+    import hashlib
+    import struct
+    sha = hashlib.sha1()
+    sha.update(np.ascontiguousarray(mhMesh["faces"], dtype="<i4").tobytes())
+    sha.update(np.ascontiguousarray(mhMesh["uv_faces"], dtype="<i4").tobytes())
+    sha.update(struct.pack("<i", len(mhMesh["uv_coordinates"])))
+    return sha.hexdigest()
+
+
+def saveBaseMeshTopology(human, folder):
+    """
+    Writes the topology of the human seed mesh as hm8_topology_<hash>.mxa
+    in folder, unless an earlier export already did.
+    """
+    mhMesh = OrderedDict()
+    addMesh(mhMesh, human.getSeedMesh())
+    thash = getTopologyHash(mhMesh)
+    filepath = os.path.join(folder, "hm8_topology_%s.mxa" % thash)
+    if os.path.exists(filepath):
+        return
+    mhTopo = OrderedDict()
+    mhTopo["basemesh"] = "hm8"
+    mhTopo["hash"] = thash
+    for key in ["faces", "uv_faces", "uv_coordinates"]:
+        mhTopo[key] = mhMesh[key]
+    saveJson(mhTopo, filepath)
+    log.message("Base mesh topology %s written" % filepath)
+
+
+def saveBaseMeshReferences(human, mhGeos, filepath):
+    """
+    Writes the topology and the neutral shape next to the mhx2 file if
+    any mesh refers to them.
+    """
+    folder = os.path.dirname(filepath)
+    keys = set()
+    for mhGeo in mhGeos:
+        for key in ["mesh", "seed_mesh"]:
+            if key in mhGeo.keys():
+                keys.update(mhGeo[key].keys())
+    if "topology" in keys:
+        saveBaseMeshTopology(human, folder)
+    if "morph" in keys:
+        saveNeutralShape(folder)
+
+#-----------------------------------------------------------------------
+#   Morph deltas.
+#   Human vertex positions can be written as sparse offsets from the
+#   neutral hm8 shape in base.obj. The neutral shape is rounded the way
+#   the json encoder rounds it, so the importer gets the same positions
+#   back. It is written once as hm8_neutral_<hash>.mxa next to the mhx2
+#   file, where the importer finds and caches it. The exported mesh is
+#   scaled and the seed mesh is not, so the scale is stored with the
+#   offsets. Characters with macro changes move most vertices, and keep
+#   absolute positions.
+#-----------------------------------------------------------------------
+
+MorphTolerance = 1e-5
+MaxMorphDensity = 0.5
+
+theNeutralShape = None
+
+def refBaseShape(mhMesh, scale):
+    if len(mhMesh["vertices"]) != NTotalVerts:
+        return
+    exact,neutral,nhash = getNeutralShape()
+    coords = np.asarray(mhMesh["vertices"], dtype=np.float32)
+    scaled = np.float32(scale)*neutral
+    diffs = np.abs(coords - np.float32(scale)*exact)
+    indices = np.nonzero(np.any(diffs >= MorphTolerance*scale, axis=1))[0]
+    if len(indices) > MaxMorphDensity*NTotalVerts:
+        return
+    mhMorph = OrderedDict()
+    mhMorph["basemesh"] = "hm8"
+    mhMorph["hash"] = nhash
+    mhMorph["scale"] = scale
+    mhMorph["indices"] = indices.astype(np.int32)
+    mhMorph["deltas"] = coords[indices] - scaled[indices]
+    del mhMesh["vertices"]
+    mhMesh["morph"] = mhMorph
+
+
+def getNeutralShape():
+    """
+    The exact neutral shape, the same shape as written to json, and
+    the hash of the latter. Unmoved vertices are found with the exact
+    shape, and offsets are taken from the rounded one.
+    """
+    global theNeutralShape
+    if theNeutralShape is None:
+        import json
+        import hashlib
+        import files3d
+        import getpath
+        obj = files3d.loadMesh(getpath.getSysDataPath("3dobjs/base.obj"))
+        exact = np.asarray(obj.coord, dtype=np.float32)
+        rounded = np.array(json.loads(encodeNumericArray(exact)), dtype=np.float32)
+        nhash = hashlib.sha1(rounded.astype("<f4").tobytes()).hexdigest()
+        theNeutralShape = (exact, rounded, nhash)
+    return theNeutralShape
+
+
+def saveNeutralShape(folder):
+    """
+    Writes the neutral shape as hm8_neutral_<hash>.mxa in folder, unless
+    an earlier export already did. The importer can also bundle it as
+    data/hm8/basemesh/neutral.mxa.
+    """
+    _exact,coords,nhash = getNeutralShape()
+    filepath = os.path.join(folder, "hm8_neutral_%s.mxa" % nhash)
+    if os.path.exists(filepath):
+        return
+    mhShape = OrderedDict()
+    mhShape["basemesh"] = "hm8"
+    mhShape["hash"] = nhash
+    mhShape["vertices"] = coords
+    saveJson(mhShape, filepath)
+    log.message("Neutral shape %s written" % filepath)
+
 #-----------------------------------------------------------------------
 #   Naming
 #-----------------------------------------------------------------------
@@ -20,19 +20,25 @@
 import log
 import numpy as np
 
+#-----------------------------------------------------------------------
+#   The hierarchy is parsed line by line, but the motion block is read
+#   in one go into a (frames, channels) array. Rotation triples and root
+#   locations are then gathered with fancy indexing, and values smaller
+#   than ZeroTolerance are set to zero in one pass.
+#-----------------------------------------------------------------------
+
+ZeroTolerance = 1e-5
+
 def loadBvh(filepath):
     joints = []
     channels = {}
-    frames = []
-    locations = []
     ncols = 0
     isRoot = False
     hasLocation = False
     rotIndex = []
     joint = None
-    useMotion = False
-    try:
-        fp = open(filepath, "r", encoding='utf-8')
+    motion = None
+    with open(filepath, "r", encoding='utf-8') as fp:
         for line in fp:
             words = line.split()
             if len(words) == 0:
@@ -50,22 +56,44 @@ def loadBvh(filepath):
                 cnames = words[-3:]
                 channels[joint] = cnames[0][0] + cnames[1][0] + cnames[2][0]
             elif words[0] == "MOTION":
-                useMotion = True
-            elif useMotion and len(words) == ncols:
-                frame = [getTriple(idx, words) for idx in rotIndex]
-                frames.append(frame)                
-                if hasLocation:
-                    locations.append(getTriple(0, words))                
-    finally:
-        fp.close()
+                motion = readMotion(fp, ncols)
+                break
+
+    if motion is None:
+        motion = np.zeros((0, ncols))
+    motion[np.abs(motion) < ZeroTolerance] = 0
+    cols = np.add.outer(rotIndex, np.arange(3))
+    frames = motion[:, cols]
+    if hasLocation:
+        locations = motion[:, 0:3]
+    else:
+        locations = []
     return joints, channels, frames, locations
 
 
-def getTriple(idx, words):
-    triple = []
-    for word in words[idx:idx+3]:
-        x = float(word)
-        if abs(x) < 1e-5:
-            x = 0
-        triple.append(x)
-    return np.array(triple)
+def readMotion(fp, ncols):
+    """
+    Read the rest of a bvh file, after the MOTION line, into an array
+    with one row per frame. Lines that do not have ncols values, like
+    Frames: and Frame Time:, are skipped.
+    """
+    lines = fp.read().strip().splitlines()
+    start = 0
+    while start < len(lines) and not isFrameLine(lines[start], ncols):
+        start += 1
+    try:
+        values = np.fromstring(" ".join(lines[start:]), sep=" ")
+    except ValueError:
+        values = None
+    if (values is not None and ncols > 0 and
+        len(values) == ncols*(len(lines) - start)):
+        return values.reshape(-1, ncols)
+    # Irregular file, fall back to parsing each line
+    rows = [line.split() for line in lines[start:]]
+    rows = [words for words in rows if len(words) == ncols]
+    return np.array(rows, dtype=float).reshape(-1, ncols)
+
+
+def isFrameLine(line, ncols):
+    words = line.split()
+    return (len(words) == ncols and words[0] not in ["Frames:", "Frame"])
@@ -19,7 +19,10 @@
 
 
 import gzip
-import codecs
+import json
+import hashlib
+from struct import Struct
+from collections import OrderedDict
 import numpy as np
 import log
 import sys
@@ -27,22 +30,247 @@ import sys
 python3 = sys.version_info[0] >= 3
 
 
-def saveJson(struct, filepath, binary=False):
-    if binary:
+def saveJson(struct, filepath, binary=False, container=False, compresslevel=9, progress=None, workers=1):
+    if container:
+        saveContainer(struct, filepath, progress)
+    elif binary:
+        with gzip.open(filepath, 'wb', compresslevel=compresslevel) as fp:
+            writeIndexedJson(struct, fp, progress, workers)
+    else:
+        with open(filepath, "wb") as fp:
+            writeIndexedJson(struct, fp, progress, workers)
+            fp.write(b"\n")
+
+
+class BinaryWriter:
+    def __init__(self, fp):
+        self.fp = fp
+        self.pos = 0
+
+    def write(self, string):
         if python3:
-            bdata = bytes(encodeJsonData3(struct, ""), 'utf8')
+            data = bytes(string, 'utf8')
         else:
-            bdata = encodeJsonData2(struct, "")
-        with gzip.open(filepath, 'wb') as fp:
-            fp.write(bdata)
+            data = string
+        self.fp.write(data)
+        self.pos += len(data)
+
+#-----------------------------------------------------------------------
+#   Section index.
+#
+#   The third line of the file is an index with the byte offset and
+#   length of every top-level section and of every geometry, so the
+#   importer can check the version and decode only the sections it
+#   needs:
+#
+#   {
+#       "mhx2_version" : "0.31",
+#       "section_index" : {...},
+#       "skeleton" : ...
+#
+#   Offsets are counted in the uncompressed stream, from the end of the
+#   index line. The body is written to a temporary file first, because
+#   the index must precede it.
+#
+#   Every entry also has the sha1 of its text, and geometries have an
+#   id, which is the uuid of the proxy or the name of the geometry.
+#   The geometry hash leaves out the geometry uuid, which is new for
+#   every export. A patch is made by comparing these hashes.
+#-----------------------------------------------------------------------
+
+IndexKey = "section_index"
+
+def writeIndexedJson(struct, fp, progress=None, workers=1):
+    import tempfile
+    import shutil
+
+    keys = list(struct.keys())
+    if len(keys) < 2 or keys[0] != "mhx2_version":
+        streamJson(struct, BinaryWriter(fp), progress, workers)
+        return
+
+    with tempfile.TemporaryFile() as tmp:
+        index = streamJson(struct, BinaryWriter(tmp), progress, workers, keys[1:])
+        pad = "    "
+        writer = BinaryWriter(fp)
+        writer.write("{\n%s\"mhx2_version\" : \"%s\",\n" % (pad, struct["mhx2_version"]))
+        writer.write("%s\"%s\" : %s," % (pad, IndexKey, json.dumps(index, separators=(",",":"))))
+        tmp.seek(0)
+        shutil.copyfileobj(tmp, fp, 1 << 20)
+
+
+def streamJson(struct, fp, progress=None, workers=1, keys=None):
+    """
+    Writes the same text as encodeJsonData3(struct), but encodes and
+    writes one top-level section, and one geometry, at a time, so the
+    whole document is never held as one string. With workers > 1 the
+    geometries are encoded in a process pool.
+
+    If keys are given, only those sections are written, as the
+    continuation of the index line, and the section index is returned.
+    """
+    if python3:
+        encode = encodeJsonData3
     else:
-        if python3:
-            string = encodeJsonData3(struct, "")
+        encode = encodeJsonData2
+
+    if not struct:
+        fp.write("{}")
+        return
+    pad = "    "
+    if keys is None:
+        keys = list(struct.keys())
+        fp.write("{")
+        base = fp.pos
+    else:
+        # Offsets are counted after the newline that ends the index line
+        base = fp.pos + 1
+
+    index = OrderedDict()
+    for n,key in enumerate(keys):
+        value = struct[key]
+        if n > 0:
+            fp.write(",")
+        fp.write("\n%s\"%s\" : " % (pad, key))
+        start = fp.pos - base
+        if key == "geometries" and value:
+            items = []
+            fp.write("[")
+            strings = encodeGeometries(value, pad+pad, workers)
+            for m,(elt,string) in enumerate(zip(value, strings)):
+                if m > 0:
+                    fp.write(",")
+                fp.write("\n" + pad + pad)
+                first = fp.pos - base
+                fp.write(string)
+                items.append(getGeometryEntry(elt, string, first, fp.pos - base - first))
+                if progress:
+                    progress(float(m+1)/len(value), "Writing geometry %s" % elt["name"])
+            fp.write("\n%s]" % pad)
+            index[key] = {"offset" : start, "length" : fp.pos - base - start, "items" : items}
         else:
-            string = encodeJsonData2(struct, "")
-        with codecs.open(filepath, "w", encoding="utf-8") as fp:
+            string = encode(value, pad)
             fp.write(string)
-            fp.write("\n")
+            index[key] = [start, fp.pos - base - start, getSectionHash(string)]
+    fp.write("\n}")
+    return index
+
+
+def getGeometryEntry(mhGeo, string, offset, length):
+    entry = OrderedDict()
+    entry["name"] = mhGeo["name"]
+    entry["human"] = mhGeo["human"]
+    if "proxy" in mhGeo.keys():
+        entry["type"] = mhGeo["proxy"]["type"]
+    else:
+        entry["type"] = None
+    entry["id"] = getGeometryId(mhGeo)
+    entry["hash"] = getGeometryHash(mhGeo, string)
+    entry["offset"] = offset
+    entry["length"] = length
+    return entry
+
+
+def getGeometryId(mhGeo):
+    if "proxy" in mhGeo.keys() and mhGeo["proxy"].get("uuid"):
+        return mhGeo["proxy"]["uuid"]
+    else:
+        return mhGeo["name"]
+
+
+def getSectionHash(string):
+    return hashlib.sha1(string.encode("utf-8")).hexdigest()
+
+
+def getGeometryHash(mhGeo, string):
+    if "uuid" in mhGeo.keys():
+        string = string.replace(mhGeo["uuid"], "")
+    return getSectionHash(string)
+
+
+def encodeGeometries(mhGeos, pad, workers=1):
+    """
+    Yields the encoded geometries in order. At most two geometries per
+    worker are in flight, so finished strings do not pile up in memory.
+    If the pool cannot be used, the geometries are encoded here instead.
+    Geometries kept by the export cache are only encoded once.
+    """
+    if python3:
+        encode = encodeJsonData3
+    else:
+        encode = encodeJsonData2
+
+    pool = None
+    if python3 and workers > 1 and len(mhGeos) > 1:
+        try:
+            from concurrent.futures import ProcessPoolExecutor
+            pool = ProcessPoolExecutor(max_workers=min(workers, len(mhGeos)))
+        except Exception as err:
+            log.message("Parallel encoding not available: %s" % err)
+    if pool is None:
+        for mhGeo in mhGeos:
+            string = getEncoded(mhGeo, pad)
+            if string is None:
+                string = encode(mhGeo, pad)
+                setEncoded(mhGeo, pad, string)
+            yield string
+        return
+
+    try:
+        futures = {}
+        window = 2*workers
+        for n,mhGeo in enumerate(mhGeos):
+            for m in range(n, min(n+window, len(mhGeos))):
+                if m not in futures.keys():
+                    futures[m] = submitEncoding(pool, mhGeos[m], pad)
+            future = futures.pop(n)
+            try:
+                string = future.result()
+            except Exception as err:
+                log.message("Parallel encoding of %s failed: %s" % (mhGeo["name"], err))
+                string = encode(mhGeo, pad)
+            setEncoded(mhGeo, pad, string)
+            yield string
+    finally:
+        pool.shutdown(wait=False)
+
+
+def submitEncoding(pool, mhGeo, pad):
+    from concurrent.futures import Future
+    string = getEncoded(mhGeo, pad)
+    if string is None:
+        try:
+            return pool.submit(encodeJsonData3, mhGeo, pad)
+        except Exception:
+            string = encodeJsonData3(mhGeo, pad)
+    future = Future()
+    future.set_result(string)
+    return future
+
+
+class CachedDict(OrderedDict):
+    """
+    A geometry or other block that the exporter keeps between exports,
+    with its json text for each padding. Only the uuid may change
+    after encoding.
+    """
+    def __init__(self, *args):
+        OrderedDict.__init__(self, *args)
+        self.encoded = {}
+
+
+def getEncoded(data, pad):
+    if not isinstance(data, CachedDict) or pad not in data.encoded.keys():
+        return None
+    uuid,string = data.encoded[pad]
+    if uuid and uuid != data.get("uuid"):
+        string = string.replace(uuid, data["uuid"])
+    return string
+
+
+def setEncoded(data, pad, string):
+    if isinstance(data, CachedDict):
+        data.encoded[pad] = (data.get("uuid"), string)
 
 
 def encodeJsonData3(data, pad=""):
@@ -67,6 +295,8 @@ def encodeJsonData3(data, pad=""):
         return "\"%s\"" % data
     elif isinstance(data, bytes):
         return "\"%s\"" % str(data, 'utf8')
+    elif isinstance(data, np.ndarray) and UseArrayEncoder and isNumericArray(data):
+        return encodeNumericArray(data)
     elif isinstance(data, (list, tuple, np.ndarray)):
         if leafList(data):
             string = "["
@@ -82,14 +312,19 @@ def encodeJsonData3(data, pad=""):
             else:
                 return string + "\n%s]" % pad
     elif isinstance(data, dict):
+        string = getEncoded(data, pad)
+        if string is not None:
+            return string
         string = "{"
         string += ",".join(
             ["\n    %s\"%s\" : " % (pad, key) + encodeJsonData3(value, pad+"    ")
              for key,value in data.items()])
         if string == "{":
-            return "{}"
+            string = "{}"
         else:
-            return string + "\n%s}" % pad
+            string += "\n%s}" % pad
+        setEncoded(data, pad, string)
+        return string
     else:
         log.debug(data)
         raise RuntimeError("Can't encode: %s %s" % (data, data.type))
@@ -147,3 +382,456 @@ def leafList(data):
         if isinstance(elt, (list,tuple,dict)):
             return False
     return True
+
+
+#-----------------------------------------------------------------------
+#   Bulk encoding of numeric arrays. Gives the same text as the
+#   recursive encoder, which writes arrays as leaf lists on one line,
+#   but formats all scalars with one map call and groups them into
+#   rows with zip, instead of dispatching on the type of every element.
+#-----------------------------------------------------------------------
+
+UseArrayEncoder = True
+
+def isNumericArray(data):
+    return (data.dtype.kind in "biuf" and data.size > 0 and data.ndim > 0)
+
+
+def encodeNumericArray(data):
+    kind = data.dtype.kind
+    values = data.ravel().tolist()
+    if kind == "b":
+        strs = [("true" if value else "false") for value in values]
+    elif kind == "f":
+        strs = list(map("%.5g".__mod__, values))
+        absvals = np.abs(data.ravel())
+        for n in np.nonzero(absvals < 1e-6)[0].tolist():
+            strs[n] = "0"
+        # otherwise %.5g will destroy index numbers bigger than 100000 by writing 1e05
+        for n in np.nonzero(absvals > 99999)[0].tolist():
+            strs[n] = "%d" % int(values[n])
+    else:
+        strs = list(map(str, values))
+
+    for size in reversed(data.shape[1:]):
+        strs = list(map("[%s]".__mod__, map(",".join, zip(*[iter(strs)]*size))))
+    return "[" + ",".join(strs) + "]"
+
+#-----------------------------------------------------------------------
+#   Container variant: a JSON header followed by raw little-endian blobs
+#   that the importer memory-maps as numpy arrays.
+#
+#   Layout:
+#       magic (8 bytes), container version (uint32), header length (uint32)
+#       header: utf-8 json {"blobs" : [...], "struct" : {...}}
+#       padding to ContainerAlign
+#       blobs, each starting at a multiple of ContainerAlign
+#
+#   Arrays in the struct are replaced by {"$blob" : n}, and blob n is
+#   described by {"type" : ..., "shape" : [...], "offset" : ...} where
+#   offset is relative to the start of the blob area. Identical arrays
+#   share one blob.
+#-----------------------------------------------------------------------
+
+ContainerMagic = b"MHX2BLOB"
+ContainerVersion = 1
+ContainerAlign = 64
+ContainerPrefix = Struct("<8sII")
+
+BlobTypes = {
+    "f4" : np.dtype("<f4"),
+    "i4" : np.dtype("<i4"),
+    "i2" : np.dtype("<i2"),
+    "u1" : np.dtype("<u1"),
+    "u2" : np.dtype("<u2"),
+    "weights" : np.dtype([("vn", "<i4"), ("w", "<f4")]),
+    "fitting" : np.dtype([("vnums", "<i4", 3), ("weights", "<f4", 3), ("offsets", "<f4", 3)]),
+}
+
+MeshBlobTypes = [
+    ("vertices", "f4"),
+    ("uv_coordinates", "f4"),
+    ("faces", "i4"),
+    ("uv_faces", "i4"),
+]
+
+
+def saveContainer(struct, filepath, progress=None):
+    blobs = []
+    shared = {}
+    mhFile = OrderedDict(struct)
+    geoBlobs = {}
+    if "geometries" in struct.keys():
+        mhFile["geometries"] = []
+        for mhGeo in struct["geometries"]:
+            mhFile["geometries"].append(blobGeometry(mhGeo, blobs, shared))
+            geoBlobs[len(blobs)] = mhGeo["name"]
+
+    table = []
+    offset = 0
+    for arr,btype in blobs:
+        table.append(OrderedDict([
+            ("type", btype),
+            ("shape", list(arr.shape)),
+            ("offset", offset)]))
+        offset = alignBlob(offset + arr.nbytes)
+    header = OrderedDict([("blobs", table), ("struct", mhFile)])
+    hdata = bytes(encodeJsonData3(header, ""), 'utf8')
+
+    with open(filepath, "wb") as fp:
+        fp.write(ContainerPrefix.pack(ContainerMagic, ContainerVersion, len(hdata)))
+        fp.write(hdata)
+        start = ContainerPrefix.size + len(hdata)
+        fp.write(bytes(alignBlob(start) - start))
+        pos = 0
+        for n,((arr,_btype),entry) in enumerate(zip(blobs, table)):
+            fp.write(bytes(entry["offset"] - pos))
+            arr.tofile(fp)
+            pos = entry["offset"] + arr.nbytes
+            if progress and n+1 in geoBlobs.keys():
+                progress(float(n+1)/len(blobs), "Writing geometry %s" % geoBlobs[n+1])
+        fp.write(bytes(offset - pos))
+
+
+def alignBlob(offset):
+    return ((offset + ContainerAlign - 1) // ContainerAlign) * ContainerAlign
+
+
+def blobGeometry(mhGeo, blobs, shared):
+    mhGeo = OrderedDict(mhGeo)
+    for key in ["mesh", "seed_mesh", "proxy_seed_mesh"]:
+        if key not in mhGeo.keys():
+            continue
+        mhMesh = mhGeo[key] = OrderedDict(mhGeo[key])
+        for mkey,btype in MeshBlobTypes:
+            if mkey in mhMesh.keys():
+                mhMesh[mkey] = addBlob(blobs, mhMesh[mkey], btype, shared)
+        if "morph" in mhMesh.keys():
+            mhMorph = mhMesh["morph"] = OrderedDict(mhMesh["morph"])
+            mhMorph["indices"] = addBlob(blobs, mhMorph["indices"], "i4", shared)
+            mhMorph["deltas"] = addBlob(blobs, mhMorph["deltas"], "f4", shared)
+        if "weights" in mhMesh.keys():
+            mhMesh["weights"] = OrderedDict(
+                [(bname, addBlob(blobs, data, "weights", shared))
+                 for bname,data in mhMesh["weights"].items()])
+    if "proxy" in mhGeo.keys():
+        mhProxy = mhGeo["proxy"] = OrderedDict(mhGeo["proxy"])
+        if "fitting" in mhProxy.keys():
+            mhProxy["fitting"] = addBlob(blobs, mhProxy["fitting"], "fitting", shared)
+    return mhGeo
+
+
+def addBlob(blobs, data, btype, shared):
+    if isinstance(data, dict) and "quantized" in data.keys():
+        qdata = OrderedDict(data)
+        for key in ["vnums", "data"]:
+            if key in qdata.keys():
+                qbtype = "i4" if key == "vnums" else qdata["quantized"]
+                qdata[key] = addBlob(blobs, qdata[key], qbtype, shared)
+        return qdata
+    dtype = BlobTypes[btype]
+    if dtype.names:
+        arr = np.zeros(len(data), dtype=dtype)
+        if len(data) > 0:
+            data = np.asarray(data)
+            if btype == "weights":
+                arr["vn"] = data[:,0]
+                arr["w"] = data[:,1]
+            else:
+                arr["vnums"] = data[:,0]
+                arr["weights"] = data[:,1]
+                arr["offsets"] = data[:,2]
+    else:
+        arr = np.ascontiguousarray(data, dtype=dtype)
+    digest = (btype, arr.shape, hashlib.sha1(arr.tobytes()).digest())
+    if digest not in shared.keys():
+        blobs.append((arr, btype))
+        shared[digest] = len(blobs)-1
+    return OrderedDict([("$blob", shared[digest])])
+
+#-----------------------------------------------------------------------
+#   Quantized encoding of positions, uv coordinates and weights.
+#
+#   Positions and uv coordinates are stored as signed integers q on a
+#   grid with step 2**exponent, so that
+#       value = (q + base) * 2**exponent
+#   with one exponent per array and one integer base per axis. The step
+#   is the smallest power of two that fits the range of the array into
+#   the integer type, so the error per coordinate is at most half a step,
+#   i.e. less than range/(2**bits - 4). For a human 2 units tall and
+#   16 bits, this is below 3.1e-5 units. Since exponent and base are
+#   integers, they are written exactly by the %.5g json encoder.
+#
+#   Weights are stored as unsigned integers with w = q/(2**bits - 1),
+#   clipped to [0,1]. The error is at most 0.5/(2**bits - 1), that is
+#   0.0020 with 8 bits and 7.7e-6 with 16 bits, plus float32 rounding
+#   in the importer.
+#-----------------------------------------------------------------------
+
+QuantizedPositionTypes = {16 : "i2", 32 : "i4"}
+QuantizedWeightTypes = {8 : "u1", 16 : "u2"}
+
+def quantizeGeometries(struct, bits=16, weightBits=16):
+    mhFile = OrderedDict(struct)
+    mhFile["geometries"] = [quantizeGeometry(mhGeo, bits, weightBits) for mhGeo in struct["geometries"]]
+    return mhFile
+
+
+def quantizeGeometry(mhGeo, bits, weightBits):
+    mhGeo = OrderedDict(mhGeo)
+    for key in ["mesh", "seed_mesh", "proxy_seed_mesh"]:
+        if key not in mhGeo.keys():
+            continue
+        mhMesh = mhGeo[key] = OrderedDict(mhGeo[key])
+        for mkey in ["vertices", "uv_coordinates"]:
+            if mkey in mhMesh.keys():
+                mhMesh[mkey] = quantizePositions(mhMesh[mkey], bits)
+        if "weights" in mhMesh.keys():
+            mhMesh["weights"] = OrderedDict(
+                [(bname, quantizeWeights(data, weightBits))
+                 for bname,data in mhMesh["weights"].items()])
+    return mhGeo
+
+
+def quantizePositions(data, bits):
+    arr = np.asarray(data, dtype=np.float64)
+    if arr.size == 0 or arr.ndim != 2:
+        return data
+    qtype = QuantizedPositionTypes[bits]
+    qmax = 2**(bits-1) - 2
+    lo = arr.min(axis=0)
+    hi = arr.max(axis=0)
+    halfrange = max(0.5*(hi - lo).max(), 1e-30)
+    exponent = int(np.ceil(np.log2(halfrange/qmax)))
+    step = 2.0**exponent
+    base = np.rint(0.5*(hi + lo)/step)
+    q = np.rint(arr/step) - base
+    return OrderedDict([
+        ("quantized", qtype),
+        ("exponent", exponent),
+        ("base", [int(b) for b in base]),
+        ("data", q.astype(BlobTypes[qtype])),
+    ])
+
+
+def quantizeWeights(data, bits):
+    arr = np.asarray(data, dtype=np.float64)
+    if arr.size == 0:
+        return data
+    qtype = QuantizedWeightTypes[bits]
+    qmax = 2**bits - 1
+    return OrderedDict([
+        ("quantized", qtype),
+        ("vnums", arr[:,0].astype(np.int32)),
+        ("data", np.rint(np.clip(arr[:,1], 0, 1)*qmax).astype(BlobTypes[qtype])),
+    ])
+
+#-----------------------------------------------------------------------
+#   Shared arrays. Identical arrays in the geometries, such as the uv
+#   coordinates of mesh and seed mesh, are written once to the
+#   top-level "arrays" table and replaced by {"$array" : n}. Arrays
+#   are identified by dtype, shape and the sha1 of their contents.
+#   The container has its own sharing of blobs and does not use this.
+#-----------------------------------------------------------------------
+
+ShareMinLength = 16
+
+def shareArrays(struct):
+    if "geometries" not in struct.keys():
+        return struct
+    mhGeos = [copyGeometry(mhGeo) for mhGeo in struct["geometries"]]
+    slots = []
+    counts = {}
+    for mhGeo in mhGeos:
+        for parent,key in getArraySlots(mhGeo):
+            digest = getArrayDigest(parent[key])
+            if digest is not None:
+                slots.append((parent, key, digest))
+                counts[digest] = counts.get(digest, 0) + 1
+
+    table = []
+    refs = {}
+    for parent,key,digest in slots:
+        if counts[digest] < 2:
+            continue
+        if digest not in refs.keys():
+            table.append(parent[key])
+            refs[digest] = OrderedDict([("$array", len(table)-1)])
+        parent[key] = refs[digest]
+
+    mhFile = OrderedDict()
+    for key,value in struct.items():
+        if key == "geometries":
+            if table:
+                mhFile["arrays"] = table
+            mhFile[key] = mhGeos
+        else:
+            mhFile[key] = value
+    return mhFile
+
+
+def copyGeometry(mhGeo):
+    mhGeo = OrderedDict(mhGeo)
+    for key in ["mesh", "seed_mesh", "proxy_seed_mesh"]:
+        if key in mhGeo.keys():
+            mhMesh = mhGeo[key] = OrderedDict(mhGeo[key])
+            for mkey,value in mhMesh.items():
+                if isinstance(value, dict):
+                    mhMesh[mkey] = OrderedDict(value)
+            if "weights" in mhMesh.keys():
+                mhWeights = mhMesh["weights"]
+                for bname,data in mhWeights.items():
+                    if isinstance(data, dict):
+                        mhWeights[bname] = OrderedDict(data)
+    if "proxy" in mhGeo.keys():
+        mhGeo["proxy"] = OrderedDict(mhGeo["proxy"])
+    return mhGeo
+
+
+def getArraySlots(mhGeo):
+    for key in ["mesh", "seed_mesh", "proxy_seed_mesh"]:
+        if key not in mhGeo.keys():
+            continue
+        mhMesh = mhGeo[key]
+        for mkey,_btype in MeshBlobTypes:
+            if mkey in mhMesh.keys():
+                for slot in getValueSlots(mhMesh, mkey):
+                    yield slot
+        if "weights" in mhMesh.keys():
+            for bname in mhMesh["weights"].keys():
+                for slot in getValueSlots(mhMesh["weights"], bname):
+                    yield slot
+    if "proxy" in mhGeo.keys() and "fitting" in mhGeo["proxy"].keys():
+        yield mhGeo["proxy"], "fitting"
+
+
+def getValueSlots(parent, key):
+    data = parent[key]
+    if isinstance(data, dict):
+        for qkey in ["vnums", "data"]:
+            if qkey in data.keys():
+                yield data, qkey
+    else:
+        yield parent, key
+
+
+def getArrayDigest(data):
+    try:
+        arr = np.asarray(data)
+    except ValueError:
+        return None
+    if arr.dtype.kind not in "biuf" or arr.size < ShareMinLength:
+        return None
+    arr = np.ascontiguousarray(arr)
+    return (arr.dtype.str, arr.shape, hashlib.sha1(arr.tobytes()).digest())
+
+#-----------------------------------------------------------------------
+#   Compact masks. A boolean mask, such as the delete_verts of a proxy,
+#   is written as whichever of these is shorter:
+#       {"encoding" : "runs", "length" : n, "runs" : [start, end, ...]}
+#       {"encoding" : "bits", "length" : n, "bits" : base64}
+#   Runs are half-open ranges of true values, and bits are packed with
+#   the first value in the most significant bit, as numpy.packbits does.
+#-----------------------------------------------------------------------
+
+def encodeMask(mask):
+    import base64
+    mask = np.asarray(mask, dtype=bool).ravel()
+    edges = np.diff(np.concatenate([[0], mask.view(np.int8), [0]]))
+    runs = np.stack([np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)], axis=1).ravel()
+    nbits = 4*((len(mask) + 23)//24)
+    if len(encodeNumericArray(runs)) <= nbits:
+        return OrderedDict([
+            ("encoding", "runs"),
+            ("length", len(mask)),
+            ("runs", runs),
+        ])
+    else:
+        bits = np.packbits(mask)
+        return OrderedDict([
+            ("encoding", "bits"),
+            ("length", len(mask)),
+            ("bits", base64.b64encode(bits.tobytes()).decode("ascii")),
+        ])
+
+#-----------------------------------------------------------------------
+#   Patches. A .mhx2patch file records what changed since a full export
+#   with a section index, the base file:
+#
+#       "base" : {"file" : name of the base file, "digest" : sha1 of its index line}
+#       "keys" : the top-level keys of the new file, in order
+#       "sections" : the top-level sections whose hash changed
+#       "geometry_patches" : [{"id" : ..., "uuid" : ..., "geometry" : ...}]
+#
+#   All geometries are listed in order, but only the changed ones have
+#   "geometry". The others are taken from the base, with the new uuid.
+#-----------------------------------------------------------------------
+
+def savePatch(struct, filepath, basepath, binary=False, compresslevel=9, workers=1):
+    """
+    Writes the patch from basepath to struct. Returns False and writes
+    nothing if basepath has no section index with hashes.
+    """
+    import os
+    header = readIndex(basepath)
+    if header is None:
+        return False
+    baseIndex,digest = header
+    if python3:
+        encode = encodeJsonData3
+    else:
+        encode = encodeJsonData2
+
+    pad = "    "
+    patch = OrderedDict()
+    patch["mhx2_version"] = struct["mhx2_version"]
+    patch["base"] = OrderedDict([("file", os.path.basename(basepath)), ("digest", digest)])
+    patch["keys"] = [key for key in struct.keys() if key != "mhx2_version"]
+    sections = patch["sections"] = OrderedDict()
+    mhGeos = patch["geometry_patches"] = []
+    for key in patch["keys"]:
+        value = struct[key]
+        if key == "geometries":
+            baseHashes = {}
+            if isinstance(baseIndex.get(key), dict):
+                for item in baseIndex[key]["items"]:
+                    baseHashes[item.get("id")] = item.get("hash")
+            strings = encodeGeometries(value, pad+pad, workers)
+            for mhGeo,string in zip(value, strings):
+                gid = getGeometryId(mhGeo)
+                entry = OrderedDict([("id", gid), ("uuid", mhGeo.get("uuid"))])
+                if baseHashes.get(gid) != getGeometryHash(mhGeo, string):
+                    entry["geometry"] = mhGeo
+                mhGeos.append(entry)
+        else:
+            entry = baseIndex.get(key)
+            if (not isinstance(entry, list) or len(entry) < 3 or
+                entry[2] != getSectionHash(encode(value, pad))):
+                sections[key] = value
+
+    saveJson(patch, filepath, binary, compresslevel=compresslevel, workers=workers)
+    return True
+
+
+def readIndex(filepath):
+    """
+    The section index of a json .mhx2 file and the sha1 of the index
+    line, or None if there is no index.
+    """
+    with open(filepath, "rb") as fp:
+        magic = fp.read(2)
+    if magic == b"\x1f\x8b":
+        fp = gzip.open(filepath, "rb")
+    else:
+        fp = open(filepath, "rb")
+    with fp:
+        if fp.readline(16) != b"{\n":
+            return None
+        if not fp.readline(256).lstrip().startswith(b'"mhx2_version"'):
+            return None
+        prefix = ('    "%s" : ' % IndexKey).encode("utf-8")
+        line = fp.readline()
+        if not line.startswith(prefix):
+            return None
+        index = json.loads(line[len(prefix):].rstrip().rstrip(b",").decode("utf-8"))
+        return index, hashlib.sha1(line).hexdigest()
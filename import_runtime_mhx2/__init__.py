@@ -111,6 +111,7 @@ class MHX_PT_Setup(bpy.types.Panel):
         scn = context.scene
 
         layout.operator("import_scene.makehuman_mhx2")
+        layout.operator("mhx2.clear_import_caches")
         #layout.operator("mhx2.make_skin_shader")
 
         if (ob is None or
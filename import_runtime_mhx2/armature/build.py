@@ -204,8 +204,9 @@ def addPropDrivers(rig, drvlist, suffix, prefix):
 
 
 def addGizmo(gname, mhGizmo, hidden):
+    from ..geometries import fillEdgeMesh
     me = bpy.data.meshes.new(gname)
-    me.from_pydata(mhGizmo["verts"], mhGizmo["edges"], [])
+    fillEdgeMesh(me, mhGizmo["verts"], mhGizmo["edges"])
     ob = bpy.data.objects.new(gname, me)
     hidden.objects.link(ob)
     putOnHiddenLayer(ob)
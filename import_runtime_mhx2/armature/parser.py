@@ -402,11 +402,11 @@ class Parser:
                 self.bones[bone.name] = bone
 
         if cfg.useCustomShapes:
-            addDict(loadJsonRelative("armature/data/mhx/gizmos-face.json"), self.gizmos)
+            addDict(loadJsonRelative("armature/data/mhx/gizmos-face.json", readonly=True), self.gizmos)
             if cfg.useCustomShapes == 'ALL':
-                addDict(loadJsonRelative("armature/data/mhx/gizmos.json"), self.gizmos)
+                addDict(loadJsonRelative("armature/data/mhx/gizmos.json", readonly=True), self.gizmos)
         if cfg.useFacePanel:
-            addDict(loadJsonRelative("armature/data/mhx/gizmos-panel.json"), self.gizmos)
+            addDict(loadJsonRelative("armature/data/mhx/gizmos-panel.json", readonly=True), self.gizmos)
 
         if not AutoWeight:
             if mhSkel is None:
@@ -986,13 +986,15 @@ class Parser:
                 fname = file
             filepath = os.path.join(folder, "vgrp_"+fname+".json")
             print("Loading %s" % filepath)
-            vglist = loadJsonRelative(filepath)
+            vglist = loadJsonRelative(filepath, readonly=True)
             for key,data in vglist:
                 try:
-                    vgroups[key] += data
+                    vgroups[key].append(data)
                 except KeyError:
-                    vgroups[key] = data
+                    vgroups[key] = [data]
             #readVertexGroups(filepath, vgroups, vgroups)
+        for key,parts in vgroups.items():
+            vgroups[key] = joinWeights(parts)
         return vgroups
 
 
@@ -1012,6 +1014,7 @@ class Parser:
         Splits a vertex group into two or three, with weights distributed
         linearly along the bone.
         """
+        import numpy as np
 
         base,ext = splitBoneName(bname)
         if base in self.splitBones.keys():
@@ -1027,42 +1030,24 @@ class Parser:
         vec /= vec.dot(vec)
         orig = self.locations[head] + self.origin
 
-        vgroup1 = []
-        vgroup2 = []
-        vgroup3 = []
-
-        #print(bname,vgroup)
+        vgroup = getWeightArray(vgroup)
+        vnums = vgroup[:,0].astype(int)
+        w = vgroup[:,1]
+        cos = np.array([self.coord[vn] for vn in vnums.tolist()]).reshape(-1,3)
+        x = np.dot(cos - np.array(orig), np.array(vec))
 
         if npieces == 2:
-            for vn,w in vgroup:
-                y = self.coord[vn] - orig
-                x = vec.dot(y)
-                if x < 0:
-                    vgroup1.append([vn,w])
-                elif x < 1:
-                    vgroup1.append([vn, (1-x)*w])
-                    vgroup2.append([vn, x*w])
-                else:
-                    vgroup2.append([vn,w])
-            self.vertexGroups[defName1] = vgroup1
-            self.vertexGroups[defName2] = vgroup2
+            self.vertexGroups[defName1] = getWeightRows(vnums, x < 1,
+                np.where(x < 0, w, (1-x)*w))
+            self.vertexGroups[defName2] = getWeightRows(vnums, x >= 0,
+                np.where(x < 1, x*w, w))
         elif npieces == 3:
-            for vn,w in vgroup:
-                y = self.coord[vn] - orig
-                x = vec.dot(y)
-                if x < 0:
-                    vgroup1.append([vn,w])
-                elif x < 0.5:
-                    vgroup1.append([vn, (1-2*x)*w])
-                    vgroup2.append([vn, (2*x)*w])
-                elif x < 1:
-                    vgroup2.append([vn, (2-2*x)*w])
-                    vgroup3.append([vn, (2*x-1)*w])
-                else:
-                    vgroup3.append([vn,w])
-            self.vertexGroups[defName1] = vgroup1
-            self.vertexGroups[defName2] = vgroup2
-            self.vertexGroups[defName3] = vgroup3
+            self.vertexGroups[defName1] = getWeightRows(vnums, x < 0.5,
+                np.where(x < 0, w, (1-2*x)*w))
+            self.vertexGroups[defName2] = getWeightRows(vnums, (x >= 0) & (x < 1),
+                np.where(x < 0.5, (2*x)*w, (2-2*x)*w))
+            self.vertexGroups[defName3] = getWeightRows(vnums, x >= 0.5,
+                np.where(x < 1, (2*x-1)*w, w))
 
 
     def mergeBones(self, mergers):
@@ -1073,7 +1058,7 @@ class Parser:
             self.headsTails[bname] = head,tail
 
             if bname in self.vertexGroups.keys():
-                vgroup = self.vertexGroups[bname]
+                vgroup = [self.vertexGroups[bname]]
             else:
                 vgroup = []
                 bone = self.bones[bname]
@@ -1082,7 +1067,7 @@ class Parser:
             for mbone in merged:
                 if mbone != bname:
                     if mbone in self.vertexGroups.keys():
-                        vgroup += self.vertexGroups[mbone]
+                        vgroup.append(self.vertexGroups[mbone])
                         del self.vertexGroups[mbone]
                     if mbone in self.bones.keys():
                         del self.bones[mbone]
@@ -1093,7 +1078,7 @@ class Parser:
                             if chead != tail:
                                 child.conn = False
 
-            self.vertexGroups[bname] = mergeWeights(vgroup)
+            self.vertexGroups[bname] = mergeWeights(joinWeights(vgroup))
 
 
     def setupRotationBones(self, rotBones):
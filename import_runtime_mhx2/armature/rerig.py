@@ -400,7 +400,7 @@ def getArmature(mhSkel):
 
 
 def getVertexGroups(mhHuman, mhSkel):
-    from .utils import mergeWeights
+    from .utils import mergeWeights, joinWeights, getWeightArray
 
     weights = mhHuman["seed_mesh"]["weights"]
     vgroups = OrderedDict()
@@ -409,8 +409,9 @@ def getVertexGroups(mhHuman, mhSkel):
         nname,known,idx = getNewName(bname, hasToes)
         if nname is None:
             continue
+        weight = getWeightArray(weight)
         if nname in vgroups.keys():
-            vgroups[nname] = mergeWeights(vgroups[nname] + weight)
+            vgroups[nname] = mergeWeights(joinWeights([vgroups[nname], weight]))
         else:
             vgroups[nname] = weight
     return vgroups
@@ -162,23 +162,38 @@ def computeRoll(head, tail, normal, bone=None):
 #
 #-------------------------------------------------------------------------------
 
+def getWeightArray(vgroup):
+    """
+    Vertex group as an (n,2) float array of [vn, w] rows, from a list of
+    pairs, an array, or the records of container files.
+    """
+    import numpy as np
+    from ..geometries import getGroupArrays
+    vnums,weights = getGroupArrays(vgroup)
+    return np.column_stack((vnums, weights))
+
+
+def joinWeights(vgroups):
+    import numpy as np
+    return np.concatenate([np.zeros((0,2))] + [getWeightArray(vgroup) for vgroup in vgroups])
+
+
+def getWeightRows(vnums, mask, weights):
+    import numpy as np
+    return np.column_stack((vnums[mask], weights[mask]))
+
+
 def mergeWeights(vgroup):
-    vgroup.sort()
-    ngroup = []
-    vn0 = -1
-    w0 = 0
-    for vn,w in vgroup:
-        if vn == vn0:
-            w0 += w
-        else:
-            ngroup.append([vn0,w0])
-            vn0 = vn
-            w0 = w
-    if vn0 >= 0:
-        ngroup.append([vn0,w0])
-    if ngroup != [] and ngroup[0][0] < 0:
-        ngroup = ngroup[1:]
-    return ngroup
+    """
+    Sorted by vertex number, with the weights of repeated vertices summed
+    and negative vertex numbers dropped.
+    """
+    import numpy as np
+    vgroup = getWeightArray(vgroup)
+    vgroup = vgroup[vgroup[:,0] >= 0]
+    vnums,inverse = np.unique(vgroup[:,0], return_inverse=True)
+    weights = np.bincount(inverse, weights=vgroup[:,1], minlength=len(vnums))
+    return np.column_stack((vnums, weights))
 
 #-------------------------------------------------------------------------------
 #
@@ -0,0 +1,201 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  Authors:             Thomas Larsson
+#  Script Copyright (C) Thomas Larsson 2014 - 2020
+#  Script Copyright (C) MakeHuman Community 2020
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+import os
+import json
+from .error import MhxError
+from .hm8 import NTotalVerts
+
+# ---------------------------------------------------------------------
+#   Shared hm8 topology.
+#
+#   The exporter can replace faces, uv_faces and uv_coordinates of the
+#   human seed mesh with a reference {"basemesh" : "hm8", "hash" : ...}.
+#   The topology is then taken from the bundled file, from a copy that
+#   was cached the first time a file with the full seed mesh was
+#   imported, or from the hm8_topology_<hash>.mxa file that the exporter
+#   writes next to the mhx2 file, which is then cached as well.
+#
+#   The hash is the sha1 of the faces and uv faces as little-endian
+#   int32, followed by the number of uv coordinates as int32. It must
+#   agree with getTopologyHash in the exporter.
+#
+#   Vertex positions can likewise be exported as a "morph" with the
+#   indices and offsets of the vertices that differ from the neutral
+#   hm8 shape, which is found in the same places as hm8_neutral_<hash>.mxa.
+# ---------------------------------------------------------------------
+
+BundledTopology = "data/hm8/basemesh/topology.mxa"
+BundledNeutralShape = "data/hm8/basemesh/neutral.mxa"
+
+def resolveBaseMeshes(struct, folder=None):
+    if "geometries" not in struct.keys():
+        return struct
+    for mhGeo in struct["geometries"]:
+        for key in ["mesh", "seed_mesh", "proxy_seed_mesh"]:
+            if key not in mhGeo.keys():
+                continue
+            mhMesh = mhGeo[key]
+            if "morph" in mhMesh.keys():
+                mhMesh["vertices"] = getMorphedVertices(mhMesh["morph"], folder)
+                del mhMesh["morph"]
+            if "topology" in mhMesh.keys():
+                mhTopo = getTopology(mhMesh["topology"], folder)
+                for tkey in ["faces", "uv_faces", "uv_coordinates"]:
+                    mhMesh[tkey] = mhTopo[tkey]
+            elif mhGeo["human"] and key == "seed_mesh":
+                saveTopology(mhMesh)
+    return struct
+
+
+def getTopology(mhRef, folder=None):
+    thash = mhRef["hash"]
+    mhTopo = findBaseMeshFile(BundledTopology, getCachedPath(thash),
+                              getTopologyFile(thash), thash, folder)
+    if mhTopo is None:
+        raise MhxError(
+            "The %s base mesh with hash\n%s\n" % (mhRef["basemesh"], thash) +
+            "was not found. Keep the file\n%s\n" % getTopologyFile(thash) +
+            "next to the mhx2 file, or import one\n" +
+            "file exported with the full base mesh first.")
+    return mhTopo
+
+
+def getMorphedVertices(mhMorph, folder=None):
+    """
+    Human vertex positions exported as sparse offsets from the neutral
+    hm8 shape, scaled by the morph scale.
+    """
+    import numpy as np
+    mhShape = getNeutralShape(mhMorph, folder)
+    if mhShape is None:
+        raise MhxError(
+            "The neutral %s shape with hash\n%s\n" % (mhMorph["basemesh"], mhMorph["hash"]) +
+            "was not found. Keep the file\n%s\n" % getNeutralFile(mhMorph["hash"]) +
+            "next to the mhx2 file, or\n" +
+            "export without morph deltas.")
+    verts = np.array(mhShape["vertices"], dtype=np.float32)
+    verts *= mhMorph.get("scale", 1.0)
+    indices = np.asarray(mhMorph["indices"], dtype=np.intp)
+    deltas = np.asarray(mhMorph["deltas"], dtype=np.float32).reshape(-1, 3)
+    np.add.at(verts, indices, deltas)
+    return verts
+
+
+def getNeutralShape(mhMorph, folder):
+    nhash = mhMorph["hash"]
+    return findBaseMeshFile(BundledNeutralShape, getCachedNeutralPath(nhash),
+                            getNeutralFile(nhash), nhash, folder)
+
+
+def findBaseMeshFile(bundled, cached, filename, fhash, folder):
+    """
+    The base mesh data with the given hash, from the bundled file, the
+    cached copy, or the file that the exporter wrote next to the mhx2
+    file in folder. The latter is copied to the cache.
+    """
+    from .load_json import loadJsonRelative, loadJson
+    for filepath in [bundled, cached]:
+        if os.path.exists(getAddonPath(filepath)):
+            struct = loadJsonRelative(filepath, readonly=True)
+            if struct and struct["hash"] == fhash:
+                return struct
+    if folder is None:
+        return None
+    filepath = os.path.join(folder, filename)
+    if not os.path.exists(filepath):
+        return None
+    struct = loadJson(filepath)
+    if not struct or struct["hash"] != fhash:
+        return None
+    try:
+        import shutil
+        cachepath = getAddonPath(cached)
+        folder = os.path.dirname(cachepath)
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        shutil.copyfile(filepath, cachepath)
+    except OSError as err:
+        print("Could not cache %s: %s" % (filepath, err))
+    return struct
+
+
+def saveTopology(mhMesh):
+    if (len(mhMesh["vertices"]) != NTotalVerts or
+        "faces" not in mhMesh.keys()):
+        return
+    thash = getTopologyHash(mhMesh)
+    filepath = getAddonPath(getCachedPath(thash))
+    if os.path.exists(filepath):
+        return
+    mhTopo = {
+        "basemesh" : "hm8",
+        "hash" : thash,
+        "faces" : toList(mhMesh["faces"]),
+        "uv_faces" : toList(mhMesh["uv_faces"]),
+        "uv_coordinates" : toList(mhMesh["uv_coordinates"]),
+    }
+    try:
+        folder = os.path.dirname(filepath)
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(filepath, "w", encoding="utf-8") as fp:
+            json.dump(mhTopo, fp)
+    except OSError as err:
+        print("Could not save base mesh topology %s: %s" % (filepath, err))
+
+
+def getTopologyHash(mhMesh):
+    import hashlib
+    import numpy as np
+    sha = hashlib.sha1()
+    sha.update(np.ascontiguousarray(mhMesh["faces"], dtype="<i4").tobytes())
+    sha.update(np.ascontiguousarray(mhMesh["uv_faces"], dtype="<i4").tobytes())
+    sha.update(np.array([len(mhMesh["uv_coordinates"])], dtype="<i4").tobytes())
+    return sha.hexdigest()
+
+
+def getCachedPath(thash):
+    return "packs/hm8_topology_%s.json" % thash
+
+
+def getTopologyFile(thash):
+    return "hm8_topology_%s.mxa" % thash
+
+
+def getNeutralFile(nhash):
+    return "hm8_neutral_%s.mxa" % nhash
+
+
+def getCachedNeutralPath(nhash):
+    return "packs/%s" % getNeutralFile(nhash)
+
+
+def getAddonPath(filepath):
+    return os.path.join(os.path.dirname(__file__), filepath)
+
+
+def toList(data):
+    if hasattr(data, "tolist"):
+        return data.tolist()
+    else:
+        return data
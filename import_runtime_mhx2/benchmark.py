@@ -0,0 +1,130 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  Authors:             Thomas Larsson
+#  Script Copyright (C) Thomas Larsson 2014 - 2020
+#  Script Copyright (C) MakeHuman Community 2020
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+"""
+Benchmarks for the importer. Run them from the Python console in Blender,
+after importing a MakeHuman file with Override Exported Data and the
+default MHX rig, with the human mesh active:
+
+    import importlib
+    bench = importlib.import_module("import_runtime_mhx2.benchmark")
+    bench.benchVertexGroups(C)
+    bench.fitGroupThresholds(C)
+
+The vertex groups are the parser.vertexGroups of that import, which the
+human mesh got its groups from. If the import had no rig parser, they
+are read back from the active mesh instead.
+"""
+
+import time
+import bpy
+
+#-----------------------------------------------------------------------
+#   Vertex groups
+#-----------------------------------------------------------------------
+
+def getBenchVertexGroups(ob):
+    from .utils import getMhHuman
+    from .geometries import getVertexGroupsFromObject
+    from .error import MhxError
+    try:
+        parser = getMhHuman()["parser"]
+    except (MhxError, KeyError):
+        parser = None
+    if parser and parser.vertexGroups:
+        print("Vertex groups of the rig parser")
+        return parser.vertexGroups
+    else:
+        print("Vertex groups of %s" % ob.name)
+        return getVertexGroupsFromObject(ob)
+
+
+def timeWriteVertexGroups(ob, vweights, method, repeat):
+    from .geometries import writeVertexGroups
+    best = None
+    for _ in range(repeat):
+        me = ob.data.copy()
+        test = bpy.data.objects.new("BenchVertexGroups", me)
+        test.vertex_groups.clear()
+        try:
+            time1 = time.perf_counter()
+            writeVertexGroups(test, vweights, method)
+            secs = time.perf_counter() - time1
+        finally:
+            bpy.data.objects.remove(test)
+            bpy.data.meshes.remove(me)
+        if best is None or secs < best:
+            best = secs
+    return best
+
+
+def benchVertexGroups(context, vweights=None, repeat=3):
+    ob = context.object
+    if vweights is None:
+        vweights = getBenchVertexGroups(ob)
+    nweights = sum([len(data) for data in vweights.values()])
+    results = {}
+    for method in ['ADD', 'BUCKETS', 'BMESH', None]:
+        best = timeWriteVertexGroups(ob, vweights, method, repeat)
+        results[method] = best
+        print("Vertex groups of %s, %d groups, %d weights, %s: %.3f s" %
+            (ob.name, len(vweights), nweights, (method or "AUTO"), best))
+    return results
+
+
+def fitGroupThresholds(context, vweights=None, repeat=3):
+    """
+    Fits BucketRatio and MinBmeshWeights in geometries to the vertex
+    groups. The costs are measured per vgrp.add call (ADD), per vertex
+    in a bucket (BUCKETS), per bmesh weight and per bmesh pass (BMESH).
+    A group is cheaper as buckets when its share of distinct weights is
+    below (bmesh weight - bucket vertex)/add call, and a bmesh pass pays
+    off above (bmesh pass)/(add call - bmesh weight) weights.
+    """
+    import numpy as np
+    from .geometries import getGroupArrays
+    ob = context.object
+    if vweights is None:
+        vweights = getBenchVertexGroups(ob)
+    nweights = sum([len(getGroupArrays(data)[0]) for data in vweights.values()])
+    ndistinct = sum([len(np.unique(getGroupArrays(data)[1])) for data in vweights.values()])
+    # One weight, for the fixed cost of a bmesh pass
+    vnums = [getGroupArrays(data)[0] for data in vweights.values()]
+    vn = [vnums1 for vnums1 in vnums if len(vnums1) > 0][0][0]
+    single = {"Single" : np.array([[vn, 0.5]])}
+
+    addCall = timeWriteVertexGroups(ob, vweights, 'ADD', repeat)/nweights
+    bucketVert = max(0.0, timeWriteVertexGroups(ob, vweights, 'BUCKETS', repeat) - ndistinct*addCall)/nweights
+    bmeshPass = timeWriteVertexGroups(ob, single, 'BMESH', repeat)
+    bmeshWeight = max(0.0, timeWriteVertexGroups(ob, vweights, 'BMESH', repeat) - bmeshPass)/nweights
+
+    ratio = min(1.0, max(0.0, (bmeshWeight - bucketVert)/addCall))
+    if addCall > bmeshWeight:
+        minWeights = int(bmeshPass/(addCall - bmeshWeight))
+    else:
+        minWeights = None
+    print("%d groups, %d weights, %d distinct weights" % (len(vweights), nweights, ndistinct))
+    print("add call %.2f us, bucket vertex %.2f us, bmesh weight %.2f us, bmesh pass %.1f ms" %
+        (1e6*addCall, 1e6*bucketVert, 1e6*bmeshWeight, 1e3*bmeshPass))
+    print("BucketRatio = %.2f, MinBmeshWeights = %s" % (ratio, minWeights))
+    return ratio, minWeights
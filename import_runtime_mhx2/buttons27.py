@@ -33,12 +33,13 @@ from .import_props import *
 
 class Mhx2Import(ImportHelper):
     filename_ext = ".mhx2"
-    filter_glob = StringProperty(default="*.mhx2", options={'HIDDEN'})
+    filter_glob = StringProperty(default="*.mhx2;*.mhx2patch", options={'HIDDEN'})
     filepath = StringProperty(subtype='FILE_PATH')
 
     useHelpers = BoolProperty(name="Helper Geometry", description="Keep helper geometry", default=False)
     useOffset = BoolProperty(name="Offset", description="Add offset for feet on ground", default=True)
     useOverride = BoolProperty(name="Override Exported Data", description="Override rig and mesh definitions in mhx2 file", default=False)
+    usePatchBase = BoolProperty(name="Keep For Patches", description="Keep the imported file in memory, so patches exported from it later import faster", default=False)
 
     useCustomShapes = BoolProperty(name="Custom Shapes", description="Custom bone shapes", default=True)
     useFaceShapes = BoolProperty(name="Face Shapes", description="Face shapes", default=False)
@@ -23,7 +23,7 @@
 import os
 
 Attributes = [
-    "useHelpers", "useOffset", "useOverride", "useHumanType",
+    "useHelpers", "useOffset", "useOverride", "useHumanType", "usePatchBase",
     "useSubsurf", "subsurfLevels", "subsurfRenderLevels",
     "useRig", "rigType", "finalizeRigify", "useRotationLimits", "genitalia",
     "hairType", "hairColor", "useHairOnProxy", "useDeflector", "useHairDynamics",
@@ -37,6 +37,7 @@ class Config:
     def __init__(self):
         self.scale = 1.0
         self.deleteHelpers = False
+        self.usePatchBase = False
         self.folder = ""
         self.setDefaults()
 
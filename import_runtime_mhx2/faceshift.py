@@ -38,7 +38,6 @@ else:
 def faceshiftBvhLoad(filepath, useHead, context):
     rig = context.object
     readingBlendShapes = False
-    readingMotion = False
     isFaceshift13 = False
     firstUnknown = ""
 
@@ -48,19 +47,12 @@ def faceshiftBvhLoad(filepath, useHead, context):
     bmotion = {}
     idx = 0
     R = math.pi/180
+    motion = None
     with open(filepath, encoding='utf-8') as fp:
         for line in fp:
             words = line.split()
             if len(words) == 0:
                 continue
-            elif readingMotion:
-                for idx,bone in bones.items():
-                    angles = [float(words[idx+n])*R for n in range(3,6)]
-                    euler = Euler(angles, 'ZXY')
-                    bmotion[bone].append(euler)
-                for idx,prop in props.items():
-                    strength = float(words[idx+5])/90.0
-                    pmotion[prop].append(strength)
             else:
                 key = words[0]
                 if key == "JOINT":
@@ -96,7 +88,15 @@ def faceshiftBvhLoad(filepath, useHead, context):
                         raise MhxError("This is not a FaceShift BVH file")
                     readingBlendShapes = False
                 elif key == "Frame":
-                    readingMotion = True
+                    motion = readBvhMotion(fp)
+                    break
+
+    if motion is not None:
+        for idx,bone in bones.items():
+            angles = motion[:, idx+3:idx+6]*R
+            bmotion[bone] = [Euler(triple, 'ZXY') for triple in angles.tolist()]
+        for idx,prop in props.items():
+            pmotion[prop] = (motion[:, idx+5]/90.0).tolist()
 
     if isFaceshift13:
         warning = (
@@ -111,6 +111,26 @@ def faceshiftBvhLoad(filepath, useHead, context):
 
     return bmotion,pmotion,warning
 
+
+def readBvhMotion(fp):
+    """
+    Read the frames that remain in a bvh file into an array with one row
+    per frame, in one go if all lines have the same number of values.
+    """
+    import numpy as np
+    lines = fp.read().strip().splitlines()
+    if not lines:
+        return np.zeros((0,0))
+    ncols = len(lines[0].split())
+    try:
+        values = np.fromstring(" ".join(lines), sep=" ")
+    except ValueError:
+        values = None
+    if values is not None and len(values) == ncols*len(lines):
+        return values.reshape(-1, ncols)
+    rows = [line.split() for line in lines]
+    return np.array([words for words in rows if words], dtype=float)
+
 #------------------------------------------------------------------------
 #    Faceshift translation table
 #------------------------------------------------------------------------
@@ -21,6 +21,7 @@
 # ##### END GPL LICENSE BLOCK #####
 
 import bpy
+import time
 from .utils import *
 from .hm8 import *
 
@@ -28,10 +29,19 @@ from .hm8 import *
 #
 # ---------------------------------------------------------------------
 
-def buildGeometry(mhGeo, mats, rig, parser, context, cfg, meshType):
+def buildGeometry(mhGeo, mats, rig, parser, context, cfg, meshType, vertexMap=None):
+    """
+    vertexMap gives the new number of each vertex, or -1 for vertices that
+    are left out. It is ignored if it does not fit the mesh.
+    """
     from .proxy import proxifyVertexGroups
 
     mhMesh = mhGeo[meshType]
+    if vertexMap is not None:
+        mhMesh = filterMesh(mhMesh, vertexMap)
+        if mhMesh is None:
+            mhMesh = mhGeo[meshType]
+            vertexMap = None
 
     if meshType == "proxy_seed_mesh" and mhGeo["human"]:
         gname = ("%s:Proxy" % mhGeo["name"].split(':',1)[0])
@@ -68,6 +78,8 @@ def buildGeometry(mhGeo, mats, rig, parser, context, cfg, meshType):
     elif "weights" in mhMesh.keys():
         vgrps = mhMesh["weights"]
 
+    if vgrps and vertexMap is not None:
+        vgrps = remapVertexGroups(vgrps, vertexMap)
     if vgrps:
         buildVertexGroups(vgrps, ob, rig)
 
@@ -82,9 +94,11 @@ def buildGeometry(mhGeo, mats, rig, parser, context, cfg, meshType):
         mod.levels = cfg.subsurfLevels
         mod.render_levels = cfg.subsurfRenderLevels
     elif "issubdivided" in mhGeo.keys() and mhGeo["issubdivided"]:
+        # Files with subdivision_levels hold the unsubdivided cage
+        levels = mhGeo.get("subdivision_levels", 1)
         mod = ob.modifiers.new("Subsurf", 'SUBSURF')
-        mod.levels = 1
-        mod.render_levels = 1
+        mod.levels = levels
+        mod.render_levels = levels
 
     mat = mats[mhGeo["material"]]
     ob.data.materials.append(mat)
@@ -101,36 +115,120 @@ def meshVertexGroups(mhMesh, parser, cfg):
         return {}
 
 
+# ---------------------------------------------------------------------
+#   Helper geometry.
+#
+#   If the helpers are not kept, they are left out when the human seed
+#   mesh is built, instead of being deleted afterwards. The body comes
+#   first in hm8, so body vertices keep their numbers, but everything
+#   goes through the vertex map.
+# ---------------------------------------------------------------------
+
+def getHelperVertexMap():
+    import numpy as np
+    vertexMap = np.full(NTotalVerts, -1, dtype=np.intp)
+    vertexMap[:NBodyVerts] = np.arange(NBodyVerts)
+    return vertexMap
+
+
+def fitsVertexMap(mhMesh, vertexMap):
+    """
+    Whether filterMesh can apply vertexMap to the mesh.
+    """
+    import numpy as np
+    if (vertexMap is None or
+        len(mhMesh["vertices"]) != len(vertexMap) or
+        "faces" not in mhMesh.keys()):
+        return False
+    try:
+        faces = np.asarray(mhMesh["faces"], dtype=np.intp)
+        uvfaces = np.asarray(mhMesh["uv_faces"], dtype=np.intp)
+    except ValueError:
+        return False
+    return (faces.ndim == 2 and len(uvfaces) == len(faces))
+
+
+def filterMesh(mhMesh, vertexMap):
+    """
+    Copy of a mesh with the vertices that vertexMap keeps, and the faces
+    that only use them. Returns None if the map does not fit the mesh.
+    """
+    import numpy as np
+    if not fitsVertexMap(mhMesh, vertexMap):
+        return None
+    faces = np.asarray(mhMesh["faces"], dtype=np.intp)
+    uvfaces = np.asarray(mhMesh["uv_faces"], dtype=np.intp)
+    keep = (vertexMap >= 0)
+    keepFaces = keep[faces].all(axis=1)
+    mhMesh = dict(mhMesh)
+    mhMesh["vertices"] = np.asarray(mhMesh["vertices"])[keep]
+    mhMesh["faces"] = vertexMap[faces[keepFaces]]
+    mhMesh["uv_faces"] = uvfaces[keepFaces]
+    return mhMesh
+
+
+def remapVertexGroups(vgrps, vertexMap):
+    """
+    Vertex groups with new vertex numbers. Groups that lose all their
+    vertices are kept empty, so they are still created.
+    """
+    import numpy as np
+    from collections import OrderedDict
+    ngrps = OrderedDict()
+    for gname,data in vgrps.items():
+        vnums,weights = getGroupArrays(data)
+        vnums = remapIndices(vnums, vertexMap)
+        keep = (vnums >= 0)
+        ngrps[gname] = np.column_stack((vnums[keep], weights[keep]))
+    return ngrps
+
+
+def remapIndices(vnums, vertexMap):
+    """
+    New numbers of vertices, -1 for vertices that are left out.
+    """
+    import numpy as np
+    vnums = np.asarray(vnums, dtype=np.intp)
+    nvnums = np.full(len(vnums), -1, dtype=np.intp)
+    ok = (vnums >= 0) & (vnums < len(vertexMap))
+    nvnums[ok] = vertexMap[vnums[ok]]
+    return nvnums
+
+
 def buildMesh(mhGeo, mhMesh, gname, context, cfg, useSeedMesh):
     scale,offset = getScaleOffset(mhGeo, cfg, useSeedMesh)
     print("BUILD", mhGeo["name"], mhGeo["scale"], scale, offset)
-    verts = [scale*zup(co)+offset for co in mhMesh["vertices"]]
+    verts = getSceneCoords(mhMesh["vertices"], scale, offset)
     ob = addMeshToScene(verts, gname, mhMesh, context)
     ob.MhxScale = mhGeo["scale"]
     ob.MhxOffset = str(list(zup(mhGeo["offset"])))
     return ob
 
 
+def getSceneCoords(coords, scale, offset):
+    """
+    scale*zup(co)+offset for all coordinates, as an (n,3) array.
+    """
+    import numpy as np
+    coords = np.asarray(coords, dtype=float).reshape(-1, 3)
+    verts = np.empty(coords.shape)
+    verts[:,0] = coords[:,0]
+    verts[:,1] = -coords[:,2]
+    verts[:,2] = coords[:,1]
+    verts *= scale
+    verts += tuple(offset)
+    return verts
+
+
 def addMeshToScene(verts, gname, mhMesh, context):
     me = bpy.data.meshes.new(gname)
-    try:
-        faces = mhMesh["faces"]
-        edges = []
-    except KeyError:
-        edges = mhMesh["edges"]
-        faces = []
-    me.from_pydata(verts, edges, faces)
-
-    for f in me.polygons:
-        f.use_smooth = True
+    if "faces" in mhMesh.keys():
+        fillMesh(me, verts, mhMesh["faces"])
+    else:
+        fillEdgeMesh(me, verts, mhMesh["edges"])
 
     uvlayer = makeNewUvloop(me)
-    uvcoords = mhMesh["uv_coordinates"]
-    n = 0
-    for f in mhMesh["uv_faces"]:
-        for vn in f:
-            uvlayer.data[n].uv = uvcoords[vn]
-            n += 1
+    addUvs(uvlayer, mhMesh["uv_coordinates"], mhMesh["uv_faces"], gname)
 
     ob = bpy.data.objects.new(gname, me)
     coll = getCollection(context)
@@ -138,6 +236,78 @@ def addMeshToScene(verts, gname, mhMesh, context):
     return ob
 
 
+def fillMesh(me, verts, faces):
+    """
+    Fill an empty mesh with vertices and smooth faces, with foreach_set
+    instead of from_pydata. Faces can be an (n,3) or (n,4) array, or a
+    list of triangles and quads.
+    """
+    import numpy as np
+    verts = np.ascontiguousarray(verts, dtype=np.float32).reshape(-1, 3)
+    loopVerts,loopTotals = getFaceLoops(faces)
+    loopStarts = np.zeros(len(loopTotals), dtype=np.int32)
+    np.cumsum(loopTotals[:-1], out=loopStarts[1:])
+
+    me.vertices.add(len(verts))
+    me.vertices.foreach_set("co", verts.ravel())
+    me.loops.add(len(loopVerts))
+    me.loops.foreach_set("vertex_index", loopVerts)
+    me.polygons.add(len(loopTotals))
+    me.polygons.foreach_set("loop_start", loopStarts)
+    if bpy.app.version < (4,0,0):
+        me.polygons.foreach_set("loop_total", loopTotals)
+    me.polygons.foreach_set("use_smooth", np.ones(len(loopTotals), dtype=bool))
+    me.update(calc_edges=True)
+
+
+def fillEdgeMesh(me, verts, edges):
+    """
+    Fill an empty mesh with vertices and edges, like fillMesh. Both can be
+    arrays or lists.
+    """
+    import numpy as np
+    verts = np.ascontiguousarray(verts, dtype=np.float32).reshape(-1, 3)
+    edges = np.ascontiguousarray(edges, dtype=np.int32).reshape(-1, 2)
+    me.vertices.add(len(verts))
+    me.vertices.foreach_set("co", verts.ravel())
+    me.edges.add(len(edges))
+    me.edges.foreach_set("vertices", edges.ravel())
+    me.update()
+
+
+def getFaceLoops(faces):
+    """
+    The vertex of each loop and the number of loops of each face.
+    """
+    import numpy as np
+    from itertools import chain
+    if isinstance(faces, np.ndarray) and faces.ndim == 2:
+        loopVerts = np.ascontiguousarray(faces, dtype=np.int32).ravel()
+        loopTotals = np.full(len(faces), faces.shape[1], dtype=np.int32)
+    else:
+        loopTotals = np.fromiter(map(len, faces), dtype=np.int32, count=len(faces))
+        loopVerts = np.fromiter(chain.from_iterable(faces), dtype=np.int32, count=int(loopTotals.sum()))
+    return loopVerts,loopTotals
+
+
+def addUvs(uvlayer, uvcoords, uvfaces, gname):
+    """
+    Write the uv coordinates of all loops with one foreach_set. uvfaces
+    can be an array or a list of triangles and quads, like faces.
+    """
+    import numpy as np
+    time1 = time.perf_counter()
+    uvcoords = np.asarray(uvcoords, dtype=np.float32).reshape(-1, 2)
+    loopUvs,_loopTotals = getFaceLoops(uvfaces)
+    if len(loopUvs) != len(uvlayer.data):
+        print("Warning: %s has %d uv loops but %d mesh loops. UVs skipped" %
+            (gname, len(loopUvs), len(uvlayer.data)))
+        return
+    uvlayer.data.foreach_set("uv", uvcoords[loopUvs].ravel())
+    time2 = time.perf_counter()
+    print("UVs of %s: %d loops in %.3f s" % (gname, len(loopUvs), time2-time1))
+
+
 def makeNewUvloop(me):
     if bpy.app.version < (2,80,0):
         uvtex = me.uv_textures.new()
@@ -152,19 +322,196 @@ def buildVertexGroups(vweights, ob, rig):
     mod.use_vertex_groups = True
     mod.use_bone_envelopes = False
     mod.object = rig
+    writeVertexGroups(ob, vweights)
 
+# ---------------------------------------------------------------------
+#   Vertex group writer.
+#
+#   Groups where many vertices share a weight, like the 1.0 weights of
+#   most bones, are written with one vgrp.add per distinct weight.
+#   Groups with mostly distinct weights are collected and written to
+#   the deform layer of a bmesh in one pass, which is cheaper than one
+#   vgrp.add per vertex. That pass has a fixed cost, so if few weights
+#   are left they are added one by one instead.
+# ---------------------------------------------------------------------
+
+BucketRatio = 0.25
+MinBmeshWeights = 2000
+
+def writeVertexGroups(ob, vweights, method=None):
+    """
+    method is 'ADD', 'BUCKETS' or 'BMESH' to force a strategy for all
+    groups, or None to pick one per group.
+    """
+    deferred = []
     for vgname,data in vweights.items():
         vgrp = ob.vertex_groups.new(name=vgname)
-        for vn,w in data:
-            vgrp.add([vn], w, 'REPLACE')
+        vnums,weights = getGroupArrays(data)
+        if len(vnums) == 0:
+            continue
+        strategy = method
+        if strategy is None:
+            strategy = getGroupStrategy(weights)
+        if strategy == 'BUCKETS':
+            addWeightBuckets(vgrp, vnums, weights)
+        elif strategy == 'BMESH':
+            deferred.append((vgrp, vnums, weights))
+        else:
+            addWeights(vgrp, vnums, weights)
+
+    if method is None and sum([len(vnums) for _,vnums,_ in deferred]) < MinBmeshWeights:
+        for vgrp,vnums,weights in deferred:
+            addWeights(vgrp, vnums, weights)
+    elif deferred:
+        addDeformWeights(ob.data, deferred)
+
+
+def getGroupArrays(data):
+    """
+    Vertex numbers and weights of a group given as (vn, w) pairs, an (n,2)
+    array, or the records of container, pack and quantized files, whose
+    first field is the vertex number and second field the weight.
+    """
+    import numpy as np
+    if isinstance(data, np.ndarray) and data.dtype.names:
+        vnfield,wfield = data.dtype.names[:2]
+        return data[vnfield].astype(np.int32), data[wfield].astype(float)
+    data = np.asarray(data, dtype=float).reshape(-1, 2)
+    vnums = np.rint(data[:,0]).astype(np.int32)
+    return vnums, data[:,1]
+
+
+def getGroupStrategy(weights):
+    import numpy as np
+    if len(np.unique(weights)) <= BucketRatio*len(weights):
+        return 'BUCKETS'
+    else:
+        return 'BMESH'
+
+
+def addWeights(vgrp, vnums, weights):
+    for vn,w in zip(vnums.tolist(), weights.tolist()):
+        vgrp.add([vn], w, 'REPLACE')
+
+
+def addWeightBuckets(vgrp, vnums, weights):
+    import numpy as np
+    order = np.argsort(weights, kind="stable")
+    values,starts = np.unique(weights[order], return_index=True)
+    buckets = np.split(vnums[order], starts[1:])
+    for w,bucket in zip(values.tolist(), buckets):
+        vgrp.add(bucket.tolist(), w, 'REPLACE')
 
 
+def addDeformWeights(me, groups):
+    """
+    Blender has no bulk setter for deform weights, so they are set one by
+    one. The weights of all groups are sorted by vertex first, so each
+    vertex and its deform layer are looked up once, instead of once per
+    weight, and a vertex gets all its groups in one assignment loop.
+    """
+    import bmesh
+    import numpy as np
+    vnums = np.concatenate([vnums for _vgrp,vnums,_weights in groups])
+    gnums = np.concatenate([np.full(len(vnums), vgrp.index, dtype=np.int32)
+                            for vgrp,vnums,_weights in groups])
+    weights = np.concatenate([weights for _vgrp,_vnums,weights in groups])
+    order = np.argsort(vnums, kind="stable")
+    vnums = vnums[order]
+    starts = np.flatnonzero(np.diff(vnums)) + 1
+    bounds = [0] + starts.tolist() + [len(vnums)]
+    firsts = vnums[bounds[:-1]].tolist()
+    gnums = gnums[order].tolist()
+    weights = weights[order].tolist()
+
+    bm = bmesh.new()
+    try:
+        bm.from_mesh(me)
+        layer = bm.verts.layers.deform.verify()
+        bm.verts.ensure_lookup_table()
+        verts = bm.verts
+        for n,vn in enumerate(firsts):
+            dvert = verts[vn][layer]
+            for k in range(bounds[n], bounds[n+1]):
+                dvert[gnums[k]] = weights[k]
+        bm.to_mesh(me)
+    finally:
+        bm.free()
+
+
+# ---------------------------------------------------------------------
+#   Vertex group reader.
+#
+#   The weights of all groups are read in one pass over the deform layer
+#   of a bmesh, and returned as numpy arrays per group.
+# ---------------------------------------------------------------------
+
 def getVertexGroupsFromObject(ob):
-    vgrps = dict([(vgrp.index, (vgrp.name, [])) for vgrp in ob.vertex_groups])
-    for v in ob.data.vertices:
-        for g in v.groups:
-            vgrps[g.group][1].append((v.index, g.weight))
-    return dict(vgrps.values())
+    """
+    Vertex groups in the format of buildVertexGroups: an (n,2) array of
+    vertex numbers and weights per group name.
+    """
+    import numpy as np
+    vgrps = getVertexGroupArrays(ob)
+    return dict([(gname, np.column_stack(data)) for gname,data in vgrps.items()])
+
+
+def getVertexGroupArrays(ob, gnames=None):
+    """
+    (indices, weights) arrays per group name, for all groups or the
+    groups in gnames. Indices are sorted.
+    """
+    import numpy as np
+    vgrps = [vgrp for vgrp in ob.vertex_groups
+             if gnames is None or vgrp.name in gnames]
+    vnums,gnums,weights = getDeformWeights(ob.data, [vgrp.index for vgrp in vgrps])
+    order = np.argsort(gnums, kind="stable")
+    gnums = gnums[order]
+    vnums = vnums[order]
+    weights = weights[order]
+    result = {}
+    for vgrp in vgrps:
+        first,last = np.searchsorted(gnums, [vgrp.index, vgrp.index+1])
+        result[vgrp.name] = (vnums[first:last], weights[first:last])
+    return result
+
+
+def getDeformWeights(me, gnums=None):
+    """
+    Vertex numbers, group numbers and weights of all deform weights, or of
+    the groups in gnums, ordered by vertex.
+    """
+    import bmesh
+    import numpy as np
+    bm = bmesh.new()
+    try:
+        bm.from_mesh(me)
+        layer = bm.verts.layers.deform.active
+        if layer is None:
+            items = []
+        elif gnums is None:
+            items = [(v.index, gn, w) for v in bm.verts for gn,w in v[layer].items()]
+        else:
+            gnums = set(gnums)
+            items = [(v.index, gn, w) for v in bm.verts for gn,w in v[layer].items()
+                     if gn in gnums]
+    finally:
+        bm.free()
+    items = np.array(items, dtype=float).reshape(-1, 3)
+    return (items[:,0].astype(np.int32), items[:,1].astype(np.int32),
+            items[:,2].astype(np.float32))
+
+
+def selectVertexGroup(ob, vgrp):
+    """
+    Select the vertices in a vertex group, keeping the current selection.
+    """
+    import numpy as np
+    vnums,_weights = getVertexGroupArrays(ob, [vgrp.name])[vgrp.name]
+    select = np.zeros(len(ob.data.vertices), dtype=bool)
+    ob.data.vertices.foreach_get("select", select)
+    select[vnums] = True
+    ob.data.vertices.foreach_set("select", select)
 
 
 def getScaleOffset(struct, cfg, useSeedMesh):
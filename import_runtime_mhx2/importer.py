@@ -68,6 +68,7 @@ class MHX_OT_Import(bpy.types.Operator, Mhx2Import):
 
     def draw(self, context):
         layout = self.layout
+        layout.prop(self, "usePatchBase")
         layout.prop(self, "useOverride")
         if not self.useOverride:
             return
@@ -141,28 +142,60 @@ class MHX_OT_Import(bpy.types.Operator, Mhx2Import):
 def importMhx2File(filepath, cfg, context):
     filepath = os.path.expanduser(filepath)
     cfg.folder = os.path.dirname(filepath)
-    struct, time1 = importMhx2Json(filepath)
+    struct, time1 = importMhx2Json(filepath, cfg)
     build(struct, cfg, context)
     time2 = time.perf_counter()
     print("File %s loaded in %g s" % (filepath, time2-time1))
 
 
-def importMhx2Json(filepath):
-    from .load_json import loadJson
+def importMhx2Json(filepath, cfg=None):
+    from .patch import loadPatch, rememberBase, isPatchExpected
 
-    if os.path.splitext(filepath)[1].lower() != ".mhx2":
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext not in [".mhx2", ".mhx2patch"]:
         print("Error: Not a mhx2 file: %s" % filepath.encode('utf-8', 'strict'))
         return
     print( "Opening MHX2 file %s " % filepath.encode('utf-8', 'strict') )
 
     time1 = time.perf_counter()
-    struct = loadJson(filepath)
+    if ext == ".mhx2patch":
+        struct = loadPatch(filepath)
+    else:
+        struct = loadMhx2Struct(filepath, cfg)
+        if (cfg and cfg.usePatchBase) or isPatchExpected(filepath):
+            rememberBase(filepath, struct)
+    return struct, time1
+
+
+def loadMhx2Struct(filepath, cfg=None):
+    from .load_json import loadJson, loadJsonSections
+
+    struct = None
+    if cfg is not None:
+        useSection,useGeometry = getSectionFilters(cfg)
+        struct = loadJsonSections(filepath, checkVersion, useSection, useGeometry)
+    if struct is None:
+        struct = loadJson(filepath)
 
     try:
         vstring = struct["mhx2_version"]
     except KeyError:
         vstring = ""
+    checkVersion(vstring)
+    return processStruct(struct, os.path.dirname(filepath))
+
+
+def processStruct(struct, folder=None):
+    from .load_json import resolveSharedArrays, dequantizeGeometries
+    from .basemesh import resolveBaseMeshes
+
+    resolveSharedArrays(struct)
+    dequantizeGeometries(struct)
+    resolveBaseMeshes(struct, folder)
+    return struct
+
 
+def checkVersion(vstring):
     if vstring:
         high,low = vstring.split(".")
         fileVersion = 100*int(high) + int(low)
@@ -178,7 +211,30 @@ def importMhx2Json(filepath):
             "0.%d and 0.%d" % (LowestVersion, HighestVersion))
             )
 
-    return struct, time1
+
+def getSectionFilters(cfg):
+    """
+    Sections and geometries that build() will not use with this config.
+    Must agree with build().
+    """
+    useSkeleton = (not cfg.useOverride or
+        (cfg.useRig and cfg.rigType in ['EXPORTED', 'EXPORTED_MHX', 'EXPORTED_RIGIFY']))
+
+    def useSection(key):
+        if key == "skeleton":
+            return useSkeleton
+        return True
+
+    def useGeometry(item):
+        if item["human"] or item["type"] is None:
+            return True
+        elif item["type"] == "Hair" and cfg.hairType != 'NONE':
+            return False
+        elif item["type"] == "Genitals" and cfg.genitalia != 'NONE':
+            return False
+        return True
+
+    return useSection, useGeometry
 
 
 def build(struct, cfg, context):
@@ -247,6 +303,11 @@ def build(struct, cfg, context):
     human = None
     proxies = []
     proxy = None
+    # vertexMap is set if the helpers were left out when the human was built
+    helperMap = vertexMap = None
+    if cfg.deleteHelpers:
+        from .geometries import getHelperVertexMap
+        helperMap = getHelperVertexMap()
     for mhGeo in struct["geometries"]:
         if "proxy" in mhGeo.keys():
             mhProxy = mhGeo["proxy"]
@@ -256,7 +317,8 @@ def build(struct, cfg, context):
                         proxy = buildGeometry(mhGeo, mats, rig, parser, context, cfg, "proxy_seed_mesh")
                         proxy.MhxHuman = True
                     if cfg.useHumanType != 'PROXY':
-                        human = buildGeometry(mhGeo, mats, rig, parser, context, cfg, "seed_mesh")
+                        vertexMap = getFittingMap(mhGeo, "seed_mesh", helperMap)
+                        human = buildGeometry(mhGeo, mats, rig, parser, context, cfg, "seed_mesh", vertexMap)
                         human.MhxHuman = True
                 else:
                     proxy = buildGeometry(mhGeo, mats, rig, parser, context, cfg, "mesh")
@@ -271,7 +333,8 @@ def build(struct, cfg, context):
                 ob = buildGeometry(mhGeo, mats, rig, parser, context, cfg, cfg.getMeshType())
                 proxies.append((mhGeo, ob))
         elif mhGeo["human"]:
-            human = buildGeometry(mhGeo, mats, rig, parser, context, cfg, cfg.getMeshType())
+            vertexMap = getFittingMap(mhGeo, cfg.getMeshType(), helperMap)
+            human = buildGeometry(mhGeo, mats, rig, parser, context, cfg, cfg.getMeshType(), vertexMap)
             human.MhxHuman = True
 
     if proxy:
@@ -306,7 +369,7 @@ def build(struct, cfg, context):
         from .shapekeys import addShapeKeys
         path = "data/hm8/faceshapes/faceshapes.mxa"
         proxyTypes = ["Proxymeshes", "Eyebrows", "Eyelashes", "Teeth", "Tongue"]
-        addShapeKeys(human, path, mhHuman=mhHuman, proxies=proxies, proxyTypes=proxyTypes)
+        addShapeKeys(human, path, mhHuman=mhHuman, proxies=proxies, proxyTypes=proxyTypes, vertexMap=vertexMap)
 
         if cfg.useFaceShapeDrivers:
             from .shapekeys import addShapeKeyDriversToAll
@@ -322,9 +385,9 @@ def build(struct, cfg, context):
         from .masks import addMasks, selectAllMaskVGroups
         proxyTypes = ["Proxymeshes", "Genitals"]
         if cfg.useMasks == 'MODIFIER':
-            addMasks(mhHuman, human, proxies, proxyTypes, cfg.useConservativeMasks)
+            addMasks(mhHuman, human, proxies, proxyTypes, cfg.useConservativeMasks, vertexMap)
         elif cfg.useMasks == 'APPLY':
-            addMasks(mhHuman, human, proxies, proxyTypes, cfg.useConservativeMasks)
+            addMasks(mhHuman, human, proxies, proxyTypes, cfg.useConservativeMasks, vertexMap)
             selectAllMaskVGroups(human, proxies)
         elif cfg.useMasks == 'IGNORE':
             pass
@@ -335,7 +398,7 @@ def build(struct, cfg, context):
         setActiveObject(context, rig)
         makeBonesPosable(rig, cfg.useMhx)
 
-    if cfg.deleteHelpers:
+    if cfg.deleteHelpers and vertexMap is None:
         selectHelpers(human)
 
     if cfg.useOverride:
@@ -472,23 +535,40 @@ def deselectAll(human, proxies, context):
 
 
 def deleteAllSelected(human, proxies, context):
-    if human:
-        activateObject(context, human)
-        bpy.ops.object.mode_set(mode='EDIT')
-        bpy.ops.mesh.delete(type='VERT')
-        bpy.ops.object.mode_set(mode='OBJECT')
-    for _,pxy in proxies:
-        activateObject(context, pxy)
-        bpy.ops.object.mode_set(mode='EDIT')
-        bpy.ops.mesh.delete(type='VERT')
-        bpy.ops.object.mode_set(mode='OBJECT')
+    for ob in [human] + [pxy for _,pxy in proxies]:
+        if ob and hasSelectedVerts(ob):
+            activateObject(context, ob)
+            bpy.ops.object.mode_set(mode='EDIT')
+            bpy.ops.mesh.delete(type='VERT')
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+
+def hasSelectedVerts(ob):
+    import numpy as np
+    select = np.zeros(len(ob.data.vertices), dtype=bool)
+    ob.data.vertices.foreach_get("select", select)
+    return select.any()
+
+
+def getFittingMap(mhGeo, meshType, vertexMap):
+    """
+    vertexMap if the human is built from a mesh that it applies to,
+    otherwise None, and the helpers are deleted after the build.
+    """
+    from .geometries import fitsVertexMap
+    if fitsVertexMap(mhGeo[meshType], vertexMap):
+        return vertexMap
+    return None
 
 
 def selectHelpers(human):
+    import numpy as np
     if human is None:
         return
-    for vn in range(NBodyVerts, NTotalVerts):
-        human.data.vertices[vn].select = True
+    select = np.zeros(len(human.data.vertices), dtype=bool)
+    human.data.vertices.foreach_get("select", select)
+    select[NBodyVerts:NTotalVerts] = True
+    human.data.vertices.foreach_set("select", select)
 
 #------------------------------------------------------------------------
 #   Design human
@@ -535,6 +615,19 @@ class MHX_OT_ClearDesignHuman(bpy.types.Operator):
         context.scene.MhxDesignHuman = "None"
         return{'FINISHED'}
 
+
+class MHX_OT_ClearImportCaches(bpy.types.Operator):
+    bl_idname = "mhx2.clear_import_caches"
+    bl_label = "Clear Import Caches"
+    bl_description = "Free the bundled assets and patch base files kept in memory by earlier imports"
+
+    def execute(self, context):
+        from .load_json import clearAssetCache
+        from .patch import clearPatchBases
+        clearAssetCache()
+        clearPatchBases()
+        return{'FINISHED'}
+
 #----------------------------------------------------------
 #   Initialize
 #----------------------------------------------------------
@@ -543,6 +636,7 @@ classes = [
     MHX_OT_Import,
     MHX_OT_SetDesignHuman,
     MHX_OT_ClearDesignHuman,
+    MHX_OT_ClearImportCaches,
 ]
 
 def initialize():
@@ -27,14 +27,18 @@ from .hm8 import *
 #   Masking
 #------------------------------------------------------------------------
 
-def addMasks(mhHuman, human, proxies, proxyTypes, useConservativeMasks):
+def addMasks(mhHuman, human, proxies, proxyTypes, useConservativeMasks, vertexMap=None):
     for mhGeo,ob in proxies:
         mhProxy = mhGeo["proxy"]
         if "delete_verts" not in mhProxy.keys():
             continue
         vnums = getDeleteVerts(mhHuman, mhProxy, useConservativeMasks)
         pname = getProxyName(ob)
-        if human:
+        if human and vertexMap is not None:
+            from .geometries import remapIndices
+            hvnums = remapIndices(vnums, vertexMap)
+            addMask(human, hvnums[hvnums >= 0].tolist(), pname)
+        elif human:
             addMask(human, vnums, pname)
         for mhGeo1,ob1 in proxies:
             if ob == ob1:
@@ -46,12 +50,12 @@ def addMasks(mhHuman, human, proxies, proxyTypes, useConservativeMasks):
                 else:
                     mhMesh = mhGeo1["seed_mesh"]
                 pvnums = proxifyMask(mhProxy1, mhMesh, vnums)
-                if pvnums:
+                if len(pvnums) > 0:
                     addMask(ob1, pvnums, pname)
 
 
 def addMask(ob, vnums, pname):
-    if vnums:
+    if len(vnums) > 0:
         mod = ob.modifiers.new("Mask:%s" % pname, 'MASK')
         vgrp = ob.vertex_groups.new(name=("Delete:%s" % pname))
         mod.vertex_group = vgrp.name
@@ -80,10 +84,8 @@ def selectMaskVGroups(ob):
                 vgrp = None
                 print("Did not find vertex group %s" % grpname)
             if vgrp:
-                for v in ob.data.vertices:
-                    for g in v.groups:
-                        if g.group == vgrp.index:
-                            v.select = True
+                from .geometries import selectVertexGroup
+                selectVertexGroup(ob, vgrp)
                 ob.vertex_groups.remove(vgrp)
     for mod in delMods:
         ob.modifiers.remove(mod)
@@ -94,36 +96,47 @@ def selectMaskVGroups(ob):
 # ---------------------------------------------------------------------
 
 def getDeleteVerts(mhHuman, mhProxy, useConservativeMasks):
-    vnums = [vn for vn,delete in enumerate(mhProxy["delete_verts"]) if delete]
+    import numpy as np
+    mask = getDeleteMask(mhProxy["delete_verts"])
     if not useConservativeMasks:
-        return vnums
+        return np.flatnonzero(mask).tolist()
     if ("conservative" in mhProxy.keys() and
         not mhProxy["conservative"]):
-        return vnums
+        return np.flatnonzero(mask).tolist()
 
+    # Keep the verts of faces with at most two deleted verts
     mhMesh = mhHuman["seed_mesh"]
     nVerts = len(mhMesh["vertices"])
-    nFaces = len(mhMesh["faces"])
-    vertsFaces = dict([(vn, []) for vn in range(nVerts)])
-    facesVerts = {}
-    for fn,f in enumerate(mhMesh["faces"]):
-        facesVerts[fn] = f
-        for vn in f:
-            vertsFaces[vn].append(fn)
-
-    nFaceVerts = dict([(fn,0) for fn in range(nFaces)])
-    for vn in vnums:
-        for fn in vertsFaces[vn]:
-            nFaceVerts[fn] += 1
-
-    delVerts = dict([(vn,True) for vn in range(nVerts)])
-    for fn,ndel in nFaceVerts.items():
-        if ndel <= 2:
-            for vn in facesVerts[fn]:
-                delVerts[vn] = False
-
-    vnums = [vn for vn,delete in delVerts.items() if delete]
-    return vnums
+    faces = np.asarray(mhMesh["faces"], dtype=np.intp)
+    if len(mask) < nVerts:
+        mask = np.concatenate([mask, np.zeros(nVerts-len(mask), dtype=bool)])
+    nFaceVerts = mask[faces].sum(axis=1)
+    delVerts = np.ones(nVerts, dtype=bool)
+    delVerts[faces[nFaceVerts <= 2].ravel()] = False
+    return np.flatnonzero(delVerts).tolist()
+
+
+def getDeleteMask(data):
+    """
+    delete_verts as a boolean numpy array. It is either a list or
+    array of booleans, or compact as written by save_json.encodeMask.
+    """
+    import numpy as np
+    if not isinstance(data, dict):
+        return np.asarray(data, dtype=bool)
+    length = data["length"]
+    if data["encoding"] == "runs":
+        runs = np.asarray(data["runs"], dtype=np.intp).reshape(-1, 2)
+        edges = np.zeros(length+1, dtype=np.int8)
+        np.add.at(edges, runs[:,0], 1)
+        np.add.at(edges, runs[:,1], -1)
+        return np.cumsum(edges[:length]) > 0
+    elif data["encoding"] == "bits":
+        import base64
+        bits = np.frombuffer(base64.b64decode(data["bits"]), dtype=np.uint8)
+        return np.unpackbits(bits)[:length].astype(bool)
+    else:
+        raise MhxError("Unknown mask encoding: %s" % data["encoding"])
 
 # ---------------------------------------------------------------------
 #   Proxify masks
@@ -141,16 +154,15 @@ def proxifyMask(mhProxy, mhMesh, vnums):
     ngrps = proxifyVertexGroups(mhProxy, mhHuman)
 
     if "Mask" in ngrps.keys():
+        import numpy as np
         nverts = len(mhMesh["vertices"])
-        vmask = dict([(vn,0) for vn in range(nverts)])
-        for vn,w in ngrps["Mask"]:
-            vmask[vn] = w
-        vclear = dict([(vn,False) for vn in range(nverts)])
-        for f in mhMesh["faces"]:
-            if vmask[f[0]]*vmask[f[1]]*vmask[f[2]]*vmask[f[3]] < 0.5:
-                vclear[f[0]] = vclear[f[1]] = vclear[f[2]] = vclear[f[3]] = True
-        pvnums = [vn for vn,test in vclear.items() if not test]
-        pvnums.sort()
+        pmask = np.asarray(ngrps["Mask"])
+        vmask = np.zeros(nverts)
+        vmask[pmask[:,0].astype(np.intp)] = pmask[:,1]
+        faces = np.asarray(mhMesh["faces"], dtype=np.intp)[:,:4]
+        vclear = np.zeros(nverts, dtype=bool)
+        vclear[faces[vmask[faces].prod(axis=1) < 0.5].ravel()] = True
+        pvnums = np.flatnonzero(~vclear).tolist()
     else:
         pvnums = []
     return pvnums
@@ -41,10 +41,8 @@ def deleteHiddenVerts(human, clo):
         print("Did not find vertex group %s" % grpname)
         return
 
-    for v in human.data.vertices:
-        for g in v.groups:
-            if g.group == vgrp.index:
-                v.select = True
+    from .geometries import selectVertexGroup
+    selectVertexGroup(human, vgrp)
 
     bpy.ops.object.mode_set(mode='EDIT')
     bpy.ops.mesh.delete(type='VERT')
@@ -0,0 +1,150 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  Authors:             Thomas Larsson
+#  Script Copyright (C) Thomas Larsson 2014 - 2020
+#  Script Copyright (C) MakeHuman Community 2020
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+import os
+from collections import OrderedDict
+from .error import MhxError
+
+# ---------------------------------------------------------------------
+#   Patches.
+#
+#   A .mhx2patch file, written by save_json.savePatch in the exporter,
+#   holds the top-level sections and geometries that changed since a
+#   full .mhx2 export, the base file. The base is identified by the
+#   sha1 of its section index line, which contains the hashes of all
+#   its sections.
+#
+#   The last imported .mhx2 file is kept here, decoded and resolved,
+#   so applying a patch only decodes the changed data. That costs the
+#   memory of a second import, so a file is only kept if the user
+#   asks for it with Keep For Patches, or if a patch has already been
+#   written next to it. The Clear Import Caches button releases it.
+#   If the base is not kept, or lacks sections that were skipped when
+#   it was imported, it is loaded again.
+# ---------------------------------------------------------------------
+
+MaxPatchBases = 1
+
+thePatchBases = OrderedDict()
+
+def loadPatch(filepath):
+    from .load_json import loadJson
+    from .importer import loadMhx2Struct, checkVersion, processStruct
+
+    patch = loadJson(filepath)
+    checkVersion(patch["mhx2_version"])
+    mhBase = patch["base"]
+    basepath = os.path.join(os.path.dirname(filepath), mhBase["file"])
+    ids = [entry["id"] for entry in patch["geometry_patches"] if "geometry" not in entry.keys()]
+    keys = [key for key in patch["keys"]
+            if key != "geometries" and key not in patch["sections"].keys()]
+
+    base = getPatchBase(basepath, mhBase["digest"], keys, ids)
+    if base is None:
+        print("Loading base file %s" % basepath)
+        base = loadMhx2Struct(basepath)
+        rememberBase(basepath, base)
+        base = getPatchBase(basepath, mhBase["digest"], keys, ids)
+        if base is None:
+            raise MhxError(
+                "The patch %s\n" % os.path.basename(filepath) +
+                "was not made for the current version of\n%s" % basepath)
+
+    changed = [entry["geometry"] for entry in patch["geometry_patches"] if "geometry" in entry.keys()]
+    processStruct({"geometries" : changed}, os.path.dirname(filepath))
+    return applyPatch(base, patch)
+
+
+def isPatchExpected(filepath):
+    """
+    The exporter writes the patches of a file next to it, with the same
+    name and the extension .mhx2patch.
+    """
+    return os.path.exists(os.path.splitext(filepath)[0] + ".mhx2patch")
+
+
+def applyPatch(base, patch):
+    struct = {"mhx2_version" : patch["mhx2_version"]}
+    sections = patch["sections"]
+    for key in patch["keys"]:
+        if key in sections.keys():
+            struct[key] = sections[key]
+        elif key == "geometries":
+            baseGeos = dict([(getGeometryId(mhGeo), mhGeo) for mhGeo in base["geometries"]])
+            mhGeos = struct[key] = []
+            for entry in patch["geometry_patches"]:
+                if "geometry" in entry.keys():
+                    mhGeo = entry["geometry"]
+                else:
+                    mhGeo = dict(baseGeos[entry["id"]])
+                    if entry["uuid"] is not None:
+                        mhGeo["uuid"] = entry["uuid"]
+                mhGeos.append(mhGeo)
+        else:
+            struct[key] = base[key]
+    return struct
+
+
+def rememberBase(filepath, struct):
+    from .load_json import readJsonHeader
+    header = readJsonHeader(filepath)
+    if header is None:
+        return
+    _vstring,_index,digest = header
+    # build() adds keys to the geometries, so keep copies
+    base = dict(struct)
+    if "geometries" in base.keys():
+        base["geometries"] = [dict(mhGeo) for mhGeo in base["geometries"]]
+    path = os.path.realpath(filepath)
+    thePatchBases.pop(path, None)
+    thePatchBases[path] = (digest, base)
+    while len(thePatchBases) > MaxPatchBases:
+        thePatchBases.popitem(last=False)
+
+
+def getPatchBase(filepath, digest, keys, ids):
+    path = os.path.realpath(filepath)
+    if path not in thePatchBases.keys():
+        return None
+    digest1,base = thePatchBases[path]
+    if digest1 != digest:
+        return None
+    for key in keys:
+        if key not in base.keys():
+            return None
+    if ids:
+        baseIds = set([getGeometryId(mhGeo) for mhGeo in base.get("geometries", [])])
+        for gid in ids:
+            if gid not in baseIds:
+                return None
+    return base
+
+
+def getGeometryId(mhGeo):
+    if "proxy" in mhGeo.keys() and mhGeo["proxy"].get("uuid"):
+        return mhGeo["proxy"]["uuid"]
+    else:
+        return mhGeo["name"]
+
+
+def clearPatchBases():
+    thePatchBases.clear()
@@ -39,9 +39,10 @@ def addProxy(filepath, mhHuman, mats, context, cfg):
     from .load_json import loadJsonRelative
     from .materials import getMaterial, buildMaterial
 
-    mhGeo = loadJsonRelative(filepath)
+    # The cached file is shared, so only the keys set here are copied
+    mhGeo = loadJsonRelative(filepath, readonly=True)
     mhProxy = mhGeo["proxy"]
-    pxyGeo = mhGeo
+    pxyGeo = dict(mhGeo)
     pxyGeo["human"] = False
     pxyGeo["name"] = ("%s:%s" % (mhHuman["name"].split(":")[0], mhProxy["name"]))
     pxyGeo["offset"] = mhHuman["offset"]
@@ -53,7 +54,7 @@ def addProxy(filepath, mhHuman, mats, context, cfg):
     else:
         pxyGeo["material"] = mhHuman["material"]
     pxyGeo["scale"] = 1.0   # mhHuman["scale"]
-    mhMesh = pxyGeo["seed_mesh"] = pxyGeo["mesh"] = mhGeo["mesh"]
+    mhMesh = pxyGeo["seed_mesh"] = pxyGeo["mesh"] = dict(mhGeo["mesh"])
     pxyGeo["bounding_box"] = mhProxy["bounding_box"]
     pverts,scales = fitProxy(mhHuman, mhProxy["fitting"], pxyGeo["bounding_box"])
     mhMesh["vertices"] = pverts
@@ -61,16 +62,16 @@ def addProxy(filepath, mhHuman, mats, context, cfg):
 
 
 def fitProxy(mhHuman, mhFitting, mhScale):
+    import numpy as np
     from .shapekeys import getScales
     scales = getScales(None, mhScale, mhHuman)
     scale = mhHuman["scale"]
-    hverts = [scale*Vector(co) for co in mhHuman["seed_mesh"]["vertices"]]
-    pverts = []
-    for vnums,weights,offset in mhFitting:
-        pco = (weights[0]*hverts[vnums[0]] +
-               weights[1]*hverts[vnums[1]] +
-               weights[2]*hverts[vnums[2]])
-        pverts.append(Vector([pco[n]+scales[n]*offset[n] for n in range(3)]))
+    hverts = scale*np.asarray(mhHuman["seed_mesh"]["vertices"], dtype=float)
+    fitting = getFittingArray(mhFitting)
+    vnums = np.rint(fitting[:,0,:]).astype(np.intp)
+    pcos = (fitting[:,1,:,None]*hverts[vnums]).sum(axis=1)
+    pcos += np.array(scales)*fitting[:,2,:]
+    pverts = [Vector(pco) for pco in pcos.tolist()]
     return pverts,scales
 
 # ---------------------------------------------------------------------
@@ -86,7 +87,8 @@ def proxifyVertexGroups(mhProxy, mhHuman, parser=None):
 
     if parser:
         if ("vertex_bone_weights" in mhProxy.keys() and
-            mhProxy["vertex_bone_weights"]):
+            mhProxy["vertex_bone_weights"] is not None and
+            len(mhProxy["vertex_bone_weights"]) > 0):
             return getVertexBoneWeights(mhProxy["vertex_bone_weights"], parser)
         else:
             vgrps = parser.vertexGroups
@@ -97,37 +99,49 @@ def proxifyVertexGroups(mhProxy, mhHuman, parser=None):
         else:
             return {}
 
-    mhFitting = mhProxy["fitting"]
+    return fitVertexGroups(vgrps, mhProxy["fitting"])
+
+
+def fitVertexGroups(vgrps, mhFitting):
+    """
+    Proxy vertex groups from human vertex groups. The weight of a proxy
+    vertex is the fitting weighted sum of the weights of its three
+    reference vertices, and weights below 1e-4 are dropped.
+    """
+    import numpy as np
+    from .geometries import getGroupArrays
+    fitting = getFittingArray(mhFitting)
+    if len(fitting) == 0:
+        return {}
+    refVerts = np.rint(fitting[:,0,:]).astype(np.intp)
+    refWeights = fitting[:,1,:]
+    nverts = max(NTotalVerts, int(refVerts.max()) + 1)
+    grp0 = np.zeros(nverts)
     ngrps = {}
     for gname,ogrp in vgrps.items():
-        grp0 = dict([(vn,0.0) for vn in range(NTotalVerts)])
-        for vn,w in ogrp:
-            grp0[vn] = w
-
-        grp1 = []
-        for pvn,pdata in enumerate(mhFitting):
-            vnums,weights,_offsets = pdata
-            grp1 += [(pvn, weights[n]*grp0[vn]) for n,vn in enumerate(vnums)]
-        grp1.sort()
-
-        ngrp = []
-        if len(grp1) > 0:
-            vn0 = grp1[0][0]
-            wsum = 0.0
-            for vn,w in grp1:
-                if vn == vn0:
-                    wsum += w
-                else:
-                    if wsum > 1e-4:
-                        ngrp.append((vn0,wsum))
-                    vn0 = vn
-                    wsum = w
-            if wsum > 1e-4:
-                ngrp.append((vn0,wsum))
-            if len(ngrp) > 0:
-                ngrps[gname] = ngrp
+        vnums,weights = getGroupArrays(ogrp)
+        ok = (vnums >= 0) & (vnums < nverts)
+        grp0[:] = 0.0
+        grp0[vnums[ok]] = weights[ok]
+        pweights = (grp0[refVerts]*refWeights).sum(axis=1)
+        pvnums = np.flatnonzero(pweights > 1e-4)
+        if len(pvnums) > 0:
+            ngrps[gname] = np.column_stack((pvnums, pweights[pvnums]))
     return ngrps
 
+
+def getFittingArray(mhFitting):
+    """
+    Fitting as an (n,3,3) float array of vertex numbers, weights and
+    offsets, from json lists, pack arrays or the records of container
+    files, whose fields are vertex numbers, weights and offsets in turn.
+    """
+    import numpy as np
+    if isinstance(mhFitting, np.ndarray) and mhFitting.dtype.names:
+        return np.stack([mhFitting[field].astype(float)
+                         for field in mhFitting.dtype.names[:3]], axis=1)
+    return np.asarray(mhFitting, dtype=float).reshape(-1, 3, 3)
+
 # ---------------------------------------------------------------------
 #   For proxies with own bone weights
 # ---------------------------------------------------------------------
@@ -247,35 +261,30 @@ MHBones = {
 # ---------------------------------------------------------------------
 
 def proxifyTargets(mhProxy, targets):
-    mhFitting = mhProxy["fitting"]
+    """
+    Proxy targets from human targets. The delta of a proxy vertex is the
+    fitting weighted sum of the deltas of its three reference vertices,
+    and deltas shorter than 1e-3 are dropped.
+    """
+    import numpy as np
+    from .shapekeys import getTargetArrays, makeTargetArray
+    fitting = getFittingArray(mhProxy["fitting"])
+    if len(fitting) == 0:
+        return {}
+    refVerts = np.rint(fitting[:,0,:]).astype(np.intp)
+    refWeights = fitting[:,1,:,None]
+    nverts = max(NTotalVerts, int(refVerts.max()) + 1)
+    trg0 = np.zeros((nverts, 3))
     ntrgs = {}
     for tname,otrg in targets.items():
-        trg0 = dict([(vn,Vector()) for vn in range(NTotalVerts)])
-        for vn,delta in otrg:
-            trg0[vn] = Vector(delta)
-
-        trg1 = []
-        for pvn,pdata in enumerate(mhFitting):
-            vnums,weights,_offsets = pdata
-            trg1 += [(pvn, weights[n]*trg0[vn]) for n,vn in enumerate(vnums)]
-        trg1.sort()
-
-        ntrg = []
-        if len(trg1) > 0:
-            vn0 = trg1[0][0]
-            dsum = Vector()
-            for vn,delta in trg1:
-                if vn == vn0:
-                    dsum += delta
-                else:
-                    if dsum.length > 1e-3:
-                        ntrg.append((vn0,dsum))
-                    vn0 = vn
-                    dsum = delta
-            if dsum > 1e-4:
-                ntrg.append((vn0,dsum))
-            if len(ntrg) > 0:
-                ntrgs[tname] = ntrg
+        vnums,deltas = getTargetArrays(otrg)
+        ok = (vnums >= 0) & (vnums < nverts)
+        trg0[:] = 0.0
+        trg0[vnums[ok]] = deltas[ok]
+        pdeltas = (refWeights*trg0[refVerts]).sum(axis=1)
+        pvnums = np.flatnonzero((pdeltas*pdeltas).sum(axis=1) > 1e-6)
+        if len(pvnums) > 0:
+            ntrgs[tname] = makeTargetArray(pvnums, pdeltas[pvnums])
     return ntrgs
 
 # ---------------------------------------------------------------------
@@ -283,9 +292,9 @@ def proxifyTargets(mhProxy, targets):
 # ---------------------------------------------------------------------
 
 def getProxyCoordinates(mhHuman, filepath):
-    from .load_json import loadJson
+    from .load_json import loadJsonRelative
 
-    mhGeo = loadJson(filepath)
+    mhGeo = loadJsonRelative(filepath, readonly=True)
 
     if isHairStruct(mhGeo):
         from .hair import getHairCoords
@@ -25,7 +25,6 @@ import bpy
 from mathutils import Vector
 
 from .drivers import *
-from .utils import zup2
 if bpy.app.version < (2,80,0):
     from .buttons27 import FilenameString
 else:
@@ -35,15 +34,15 @@ else:
 #   Setup shapekeys
 #------------------------------------------------------------------------
 
-def addShapeKeys(human, filename, mhHuman, proxies=[], proxyTypes=[]):
+def addShapeKeys(human, filename, mhHuman, proxies=[], proxyTypes=[], vertexMap=None):
     from .load_json import loadJsonRelative
     from .proxy import proxifyTargets
 
     print("Setting up shapekeys")
-    struct = loadJsonRelative(filename)
+    struct = loadJsonRelative(filename, readonly=True)
     scales = getScales(human, struct["bounding_box"], mhHuman)
     if human:
-        addTargets(human, struct["targets"], scales)
+        addTargets(human, struct["targets"], scales, vertexMap)
         human.MhxHasFaceShapes = True
         if human.parent and human.parent.type == 'ARMATURE':
             human.parent.MhxHasFaceShapes = True
@@ -56,26 +55,60 @@ def addShapeKeys(human, filename, mhHuman, proxies=[], proxyTypes=[]):
             ob.MhxHasFaceShapes = True
 
 
-def addTargets(ob, targets, scales):
+def addTargets(ob, targets, scales, vertexMap=None):
+    """
+    Add a shapekey for each target, written with one foreach_set.
+    Targets are lists of (vn, delta) pairs or the records of packs.
+    """
+    import numpy as np
+    from .geometries import getSceneCoords, remapIndices
     targets = list(targets.items())
-    targets.sort()
+    targets.sort(key=lambda target: target[0])
     if not ob.data.shape_keys:
         basic = ob.shape_key_add(name="Basis")
     else:
         basic = ob.data.shape_keys.key_blocks[0]
 
+    nVerts = len(ob.data.vertices)
+    coords = np.empty(3*nVerts, dtype=np.float32)
+    ob.data.vertices.foreach_get("co", coords)
+    coords = coords.reshape(-1, 3).astype(float)
+    factors = (scales[0], scales[2], scales[1])
     for tname,data in targets:
         skey = ob.shape_key_add(name=tname)
         skey.value = 0
         skey.slider_min = -0.5
         skey.slider_max = 1.5
-        for v in ob.data.vertices:
-            skey.data[v.index].co = v.co
-        nVerts = len(ob.data.vertices)
-        for vn,delta in data[:nVerts]:
-            if vn >= nVerts:
-                break
-            skey.data[vn].co += zup2(delta, scales)
+        vnums,deltas = getTargetArrays(data)
+        if vertexMap is not None:
+            vnums = remapIndices(vnums, vertexMap)
+        ok = (vnums >= 0) & (vnums < nVerts)
+        cos = coords.copy()
+        np.add.at(cos, vnums[ok], getSceneCoords(deltas[ok], 1.0, (0,0,0))*factors)
+        skey.data.foreach_set("co", cos.ravel())
+
+
+def getTargetArrays(data):
+    """
+    Vertex numbers and (n,3) deltas of a target given as (vn, delta) pairs,
+    or as records whose first field is the vertex number and second field
+    the delta.
+    """
+    import numpy as np
+    if isinstance(data, np.ndarray) and data.dtype.names:
+        vnfield,dfield = data.dtype.names[:2]
+        return data[vnfield].astype(np.intp), np.asarray(data[dfield], dtype=float).reshape(-1, 3)
+    vnums = np.fromiter((vn for vn,_delta in data), dtype=np.intp, count=len(data))
+    deltas = np.array([delta for _vn,delta in data], dtype=float).reshape(-1, 3)
+    return vnums,deltas
+
+
+def makeTargetArray(vnums, deltas):
+    import numpy as np
+    data = np.empty(len(vnums), dtype=[("vn", np.int32), ("delta", float, 3)])
+    data["vn"] = vnums
+    data["delta"] = deltas
+    return data
 
 
 def getScales(human, struct, mhHuman):
@@ -42,9 +42,9 @@ class VisemeData:
     def load(self):
         from .load_json import loadJsonRelative
         if self._moho is None:
-            struct = loadJsonRelative("data/hm8/faceshapes/faceshapes.mxa")
+            struct = loadJsonRelative("data/hm8/faceshapes/faceshapes.mxa", readonly=True)
             self._mouthShapes = [key for key in struct["targets"].keys() if key[0:4] in ["mout", "lips", "tong"]]
-            struct = loadJsonRelative("data/hm8/faceshapes/visemes.mxa")
+            struct = loadJsonRelative("data/hm8/faceshapes/visemes.mxa", readonly=True)
             self._layout = struct["layout"]
             self._visemes = struct["visemes"]
             self._moho = struct["moho"]
@@ -0,0 +1,49 @@
+# Container and quantized files give weights as vn/w record arrays. They
+# must go through the vertex group writer like (vn, w) pairs do.
+# Needs Blender's bpy module, so it is skipped outside Blender.
+
+import os
+import sys
+import pytest
+
+bpy = pytest.importorskip("bpy")
+np = pytest.importorskip("numpy")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from import_runtime_mhx2 import load_json, geometries
+
+
+def writeWeightContainer(filepath):
+    btype = load_json.getBlobTypes()["weights"]
+    arrays = []
+    for vnums,weights in [([0, 1, 2, 3], [1.0, 1.0, 1.0, 0.5]),
+                          ([1, 3], [0.25, 0.75])]:
+        arr = np.zeros(len(vnums), dtype=btype)
+        arr["vn"] = vnums
+        arr["w"] = weights
+        arrays.append(arr)
+    header = {"struct" : {"weights" : {"Bone1" : {"$blob" : 0}, "Bone2" : {"$blob" : 1}}}}
+    load_json.writeContainer(filepath, load_json.ContainerMagic, header, [(arr,"weights") for arr in arrays])
+
+
+@pytest.mark.parametrize("method", [None, 'ADD', 'BUCKETS', 'BMESH'])
+def test_container_weights(tmp_path, method):
+    filepath = str(tmp_path / "weights.mhx2")
+    writeWeightContainer(filepath)
+    vweights = load_json.loadJson(filepath)["weights"]
+    assert vweights["Bone1"].dtype.names == ("vn", "w")
+
+    me = bpy.data.meshes.new("TestWeights")
+    me.from_pydata([(0,0,0), (1,0,0), (1,1,0), (0,1,0)], [], [(0,1,2,3)])
+    ob = bpy.data.objects.new("TestWeights", me)
+    try:
+        geometries.writeVertexGroups(ob, vweights, method)
+        vgrps = geometries.getVertexGroupArrays(ob)
+        for gname,data in vweights.items():
+            vnums,weights = vgrps[gname]
+            assert vnums.tolist() == data["vn"].tolist()
+            assert np.allclose(weights, data["w"])
+    finally:
+        bpy.data.objects.remove(ob)
+        bpy.data.meshes.remove(me)